@@ -3,13 +3,17 @@
 负责捕获游戏窗口画面
 """
 import mss
+import cv2
 import numpy as np
 import win32gui
 import win32con
 import win32process
 import threading
+import time
 from typing import Optional, Dict
 
+from fastcvt import bgra_to_bgr, bgr_to_gray, bgra_similarity, frame_similarity, make_bgra_to_bgr, warmup_async
+
 
 class ScreenCapture:
     """屏幕截图类"""
@@ -17,6 +21,10 @@ class ScreenCapture:
     # 推荐窗口大小
     DEFAULT_SIZE = (640, 480)  # (width, height)
 
+    # Win32窗口查询的缓存时间（秒），避免按截图频率发起系统调用
+    RECT_CHECK_INTERVAL = 0.25  # check_window_moved 结果缓存
+    MONITOR_CACHE_TTL = 1.0  # _update_monitor_rect 结果缓存
+
     def __init__(self, window_title: str = "魔塔", fixed_size: tuple = None, manual_region: dict = None):
         """
         初始化截图器
@@ -28,14 +36,27 @@ class ScreenCapture:
         """
         self.window_title = window_title
         self.fixed_size = fixed_size or self.DEFAULT_SIZE
-        # 不保存 mss 实例，因为它不是线程安全的
-        # 每次截图时会创建新的实例
+        # mss 实例不是线程安全的，按线程缓存（每个线程持有一个长期实例）
+        self._tls = threading.local()
         self.monitor = None
         self.window_handle = None
         self.initial_rect = None  # 记录初始窗口位置，用于检测移动
+        self._last_rect_check = 0.0  # 上次检查窗口移动的时间（monotonic）
+        self._rect_cache = False  # 上次检查窗口移动的结果
+        self._monitor_updated_at = 0.0  # 上次计算窗口监视区域的时间（monotonic）
         self.manual_region = manual_region  # 手动指定的区域
         self.use_manual = manual_region is not None  # 是否使用手动区域
-        self._lock = threading.Lock()  # 添加线程锁
+        # 截图本身不加锁（mss 实例按线程持有），只保护 monitor 的写入
+        self._monitor_lock = threading.Lock()
+
+        # 后台预热JIT内核，第一帧不必等待编译
+        warmup_async()
+
+        # 按截图尺寸特化的 BGRA->BGR 内核：(尺寸, 内核) 作为一个元组整体替换，
+        # 读取方一次取出，尺寸与内核不会错配（尺寸不符时使用通用内核）
+        self._kernel = (None, bgra_to_bgr)
+        self._kernel_target = None  # 最近一次请求特化的尺寸
+        self._kernel_lock = threading.Lock()
 
         if self.use_manual:
             # 使用手动指定的区域
@@ -46,6 +67,9 @@ class ScreenCapture:
             self._find_window()
             self._activate_window()  # 激活窗口
 
+        if self.monitor:
+            self._specialize_kernel(self.monitor["height"], self.monitor["width"])
+
     def set_manual_region(self, region: dict):
         """
         设置手动截图区域
@@ -53,15 +77,62 @@ class ScreenCapture:
         Args:
             region: {"top": y, "left": x, "width": w, "height": h}
         """
-        self.manual_region = region
-        self.monitor = region
-        self.use_manual = True
+        with self._monitor_lock:
+            self.manual_region = region
+            self.monitor = region
+            self.use_manual = True
+        self._specialize_kernel(region["height"], region["width"])
         print(f"截图区域已更新: {region}")
 
+    def _get_monitor(self) -> dict:
+        """获取截图区域，尚未确定时查找窗口"""
+        monitor = self.monitor
+        if not monitor:
+            with self._monitor_lock:
+                if not self.monitor:
+                    self._find_window()
+                monitor = self.monitor
+        return monitor
+
     def get_current_region(self) -> dict:
         """获取当前使用的截图区域"""
         return self.monitor
 
+    def _get_sct(self):
+        """获取当前线程的 mss 实例（首次调用时创建）"""
+        sct = getattr(self._tls, 'sct', None)
+        if sct is None:
+            sct = self._tls.sct = mss.mss()
+        return sct
+
+    def _specialize_kernel(self, height: int, width: int):
+        """
+        在后台线程为指定截图尺寸编译特化的转换内核
+
+        编译完成前 to_bgr 使用通用内核，调用方（如Tk线程）不必等待编译。
+        """
+        shape = (height, width)
+        with self._kernel_lock:
+            if self._kernel_target == shape:
+                return
+            self._kernel_target = shape
+
+        def build():
+            kernel = make_bgra_to_bgr(height, width)
+            with self._kernel_lock:
+                # 编译期间尺寸又变了则丢弃
+                if self._kernel_target == shape:
+                    self._kernel = (shape, kernel)
+
+        threading.Thread(target=build, name="bgra-kernel", daemon=True).start()
+
+    def _get_bgr_buffer(self, height: int, width: int) -> np.ndarray:
+        """获取当前线程预分配的BGR输出缓冲区（尺寸变化时重新分配）"""
+        buf = getattr(self._tls, 'bgr_buf', None)
+        if buf is None or buf.shape[:2] != (height, width):
+            buf = self._tls.bgr_buf = np.empty((height, width, 3), dtype=np.uint8)
+        return buf
+
     def _find_window(self) -> bool:
         """
         查找游戏窗口
@@ -83,7 +154,7 @@ class ScreenCapture:
             print(f"警告: 未找到标题包含 '{self.window_title}' 的窗口")
             print("将使用全屏截图模式")
             # 使用全屏作为默认
-            monitor = self.sct.monitors[0]  # 主显示器
+            monitor = self._get_sct().monitors[0]  # 主显示器
             self.monitor = {
                 "top": monitor["top"],
                 "left": monitor["left"],
@@ -106,6 +177,12 @@ class ScreenCapture:
         if not self.window_handle:
             return
 
+        # 缓存期内直接复用上次的结果（refresh_window 会强制刷新）
+        now = time.monotonic()
+        if self.monitor and now - self._monitor_updated_at < self.MONITOR_CACHE_TTL:
+            return
+        self._monitor_updated_at = now
+
         # 获取窗口位置和大小
         rect = win32gui.GetWindowRect(self.window_handle)
         left, top, right, bottom = rect
@@ -194,6 +271,12 @@ class ScreenCapture:
         if not self.window_handle or not self.initial_rect:
             return False
 
+        # 节流：短时间内重复调用直接返回缓存结果
+        now = time.monotonic()
+        if now - self._last_rect_check < self.RECT_CHECK_INTERVAL:
+            return self._rect_cache
+        self._last_rect_check = now
+
         try:
             current_rect = win32gui.GetWindowRect(self.window_handle)
             # 允许5像素的误差
@@ -203,6 +286,8 @@ class ScreenCapture:
                 abs(current_rect[1] - self.initial_rect[1]) > tolerance
             )
 
+            self._rect_cache = moved
+
             if moved:
                 print(f"警告: 检测到窗口已移动!")
                 print(f"  初始位置: {self.initial_rect}")
@@ -212,6 +297,7 @@ class ScreenCapture:
 
             return False
         except Exception:
+            self._rect_cache = False
             return False
 
     def capture(self) -> np.ndarray:
@@ -220,22 +306,42 @@ class ScreenCapture:
 
         Returns:
             BGR格式的图像数组
+
+        注意: 返回的是当前线程预分配的输出缓冲区，
+        只保证在同一线程的下一次截图之前有效，需要长期保存时请自行 copy()
+        """
+        return self.to_bgr(self.capture_bgra())
+
+    def capture_bgra(self) -> np.ndarray:
         """
-        with self._lock:  # 使用线程锁确保线程安全
-            if not self.monitor:
-                self._find_window()
+        截取游戏画面（mss原始BGRA数据，不做颜色转换）
 
-            # 每次创建新的 mss 实例，因为 mss 不是线程安全的
-            sct = mss.mss()
-            screenshot = sct.grab(self.monitor)
-            frame = np.array(screenshot)
+        适合只需要判断画面稳定性的场景，确认需要识别时再调用 to_bgr()
 
-            # mss返回的是RGBA，需要转换为BGR
-            frame = cvt_rgba_to_bgr(frame)
+        Returns:
+            BGRA格式的图像数组 (H, W, 4)，直接引用 mss 的截图缓冲区，
+            只保证在同一线程的下一次截图之前有效
+        """
+        screenshot = self._get_sct().grab(self._get_monitor())
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+            screenshot.height, screenshot.width, 4
+        )
 
-            return frame
+    def to_bgr(self, bgra: np.ndarray) -> np.ndarray:
+        """
+        将 capture_bgra() 的结果转换为BGR
 
-    def capture_region(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        Returns:
+            BGR格式的图像数组（当前线程预分配的输出缓冲区，下一次转换时会被覆盖）
+        """
+        # 去掉alpha通道写入预分配的BGR缓冲区
+        h, w = bgra.shape[:2]
+        shape, kernel = self._kernel
+        if shape != (h, w):
+            kernel = bgra_to_bgr
+        return kernel(bgra, self._get_bgr_buffer(h, w))
+
+    def capture_region(self, x: int, y: int, width: int, height: int) -> 'LazyFrame':
         """
         截取指定区域
 
@@ -246,52 +352,119 @@ class ScreenCapture:
             height: 高度
 
         Returns:
-            BGR格式的图像数组
+            延迟转换的截图，用到像素时才转换为BGR（只用局部时可先 crop）
         """
-        with self._lock:  # 使用线程锁确保线程安全
-            if not self.monitor:
-                self._find_window()
-
-            region = {
-                "top": self.monitor["top"] + y,
-                "left": self.monitor["left"] + x,
-                "width": width,
-                "height": height
-            }
-
-            # 每次创建新的 mss 实例
-            sct = mss.mss()
-            screenshot = sct.grab(region)
-            frame = np.array(screenshot)
-            frame = cvt_rgba_to_bgr(frame)
+        monitor = self._get_monitor()
+        region = {
+            "top": monitor["top"] + y,
+            "left": monitor["left"] + x,
+            "width": width,
+            "height": height
+        }
 
-            return frame
+        screenshot = self._get_sct().grab(region)
+        bgra = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+            screenshot.height, screenshot.width, 4
+        )
+        return LazyFrame(bgra, region)
 
     def refresh_window(self):
         """刷新窗口位置（游戏窗口移动后调用）"""
-        self._find_window()
+        with self._monitor_lock:
+            # 清除缓存，强制重新查询窗口位置
+            self._monitor_updated_at = 0.0
+            self._last_rect_check = 0.0
+            self._rect_cache = False
+            self._find_window()
+        if self.monitor:
+            self._specialize_kernel(self.monitor["height"], self.monitor["width"])
 
 
-def cvt_rgba_to_bgr(frame: np.ndarray) -> np.ndarray:
+def cvt_bgra_to_bgr(frame: np.ndarray) -> np.ndarray:
     """
-    将RGBA转换为BGR
+    将BGRA转换为BGR（mss截图的像素顺序为BGRA）
 
     Args:
-        frame: RGBA图像
+        frame: BGRA图像
 
     Returns:
-        BGR图像
+        连续内存的BGR图像
     """
-    # 去掉alpha通道
-    if frame.shape[2] == 4:
-        frame = frame[:, :, :3]
-    # RGBA到BGR
-    frame = frame[:, :, ::-1]
-    return frame
+    if frame.shape[2] == 3:
+        return frame
+    out = np.empty(frame.shape[:2] + (3,), dtype=np.uint8)
+    return bgra_to_bgr(frame, out)
+
+
+class LazyFrame:
+    """
+    延迟转换的截图
+
+    保存 mss 的原始BGRA数据，只有真正读取像素时才转换为BGR；
+    通过 crop() 或切片读取局部时只转换该局部
+    """
+
+    def __init__(self, bgra: np.ndarray, region: dict):
+        """
+        Args:
+            bgra: BGRA图像 (H, W, 4)
+            region: 该图像对应的屏幕区域 {"top", "left", "width", "height"}
+        """
+        self._bgra = bgra
+        self._bgr = None
+        self.region = region
+
+    @property
+    def shape(self) -> tuple:
+        """BGR图像的形状"""
+        return self._bgra.shape[:2] + (3,)
+
+    def as_bgr(self) -> np.ndarray:
+        """转换为BGR图像（结果会缓存）"""
+        if self._bgr is None:
+            self._bgr = cvt_bgra_to_bgr(self._bgra)
+        return self._bgr
+
+    def crop(self, y0: int, y1: int, x0: int, x1: int) -> 'LazyFrame':
+        """
+        裁剪局部区域（不转换像素）
+
+        Args:
+            y0, y1: 行范围 [y0, y1)
+            x0, x1: 列范围 [x0, x1)
+        """
+        h, w = self._bgra.shape[:2]
+        y0, y1 = max(0, min(y0, h)), max(0, min(y1, h))
+        x0, x1 = max(0, min(x0, w)), max(0, min(x1, w))
+        region = {
+            "top": self.region["top"] + y0,
+            "left": self.region["left"] + x0,
+            "width": max(0, x1 - x0),
+            "height": max(0, y1 - y0)
+        }
+        return LazyFrame(self._bgra[y0:y1, x0:x1], region)
+
+    def __getitem__(self, key):
+        if self._bgr is not None:
+            return self._bgr[key]
+        # 只在行/列上切片时，只转换切出来的部分
+        keys = key if isinstance(key, tuple) else (key,)
+        if len(keys) <= 2 and all(isinstance(k, slice) for k in keys):
+            return cvt_bgra_to_bgr(self._bgra[keys])
+        return self.as_bgr()[key]
+
+    def __array__(self, dtype=None, copy=None):
+        bgr = self.as_bgr()
+        return bgr if dtype is None else bgr.astype(dtype)
 
 
 class FrameBuffer:
-    """帧缓冲区，用于处理连续帧"""
+    """
+    帧缓冲区，用于处理连续帧
+
+    可以直接存放 capture_bgra() 的原始BGRA帧，稳定性判断不需要先转换为BGR；
+    也可以存放 stability_thumbnail() 生成的灰度缩略图，比较量只有整帧的几百分之一
+    """
 
     def __init__(self, size: int = 3):
         """
@@ -301,17 +474,31 @@ class FrameBuffer:
             size: 缓冲区大小
         """
         self.size = size
-        self.frames: list[np.ndarray] = []
+        # 预分配的环形缓冲区，首次 add 时按帧尺寸分配
+        self._ring: Optional[np.ndarray] = None
+        self._head = 0  # 下一帧写入的位置
+        self._count = 0  # 已缓存的帧数
+        warmup_async()
 
     def add(self, frame: np.ndarray):
-        """添加一帧"""
-        self.frames.append(frame)
-        if len(self.frames) > self.size:
-            self.frames.pop(0)
+        """添加一帧（拷贝到环形缓冲区，capture() 的输出缓冲区会被复用）"""
+        if self._ring is None or self._ring.shape[1:] != frame.shape:
+            # 首帧或截图区域尺寸变化时重新分配
+            self._ring = np.empty((self.size,) + frame.shape, dtype=np.uint8)
+            self._head = 0
+            self._count = 0
+
+        np.copyto(self._ring[self._head], frame)
+        self._head = (self._head + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def _get(self, offset: int) -> np.ndarray:
+        """获取倒数第 offset 帧（1表示最新一帧）"""
+        return self._ring[(self._head - offset) % self.size]
 
     def get_latest(self) -> Optional[np.ndarray]:
         """获取最新一帧"""
-        return self.frames[-1] if self.frames else None
+        return self._get(1) if self._count else None
 
     def is_stable(self, threshold: float = 0.99) -> bool:
         """
@@ -323,22 +510,49 @@ class FrameBuffer:
         Returns:
             画面是否稳定
         """
-        if len(self.frames) < 2:
+        if self._count < 2:
             return False
 
-        # 比较最后两帧
-        frame1 = cvt_gray(self.frames[-2])
-        frame2 = cvt_gray(self.frames[-1])
-
-        # 计算相似度
-        diff = np.abs(frame1.astype(float) - frame2.astype(float))
-        similarity = 1 - (diff.mean() / 255.0)
+        # 比较最后两帧的灰度相似度（BGRA帧用单次遍历的融合内核）
+        if self._ring.ndim == 3:
+            similarity = gray_similarity(self._get(2), self._get(1))
+        else:
+            similarity_func = bgra_similarity if self._ring.shape[-1] == 4 else frame_similarity
+            similarity = similarity_func(self._get(2), self._get(1))
 
         return similarity > threshold
 
 
+def stability_thumbnail(bgra: np.ndarray, size: int = 64) -> np.ndarray:
+    """
+    生成用于稳定性判断的灰度缩略图
+
+    先用区域平均缩小到 size x size，再转灰度，转换只处理缩略图的像素
+
+    Args:
+        bgra: capture_bgra() 的BGRA帧
+        size: 缩略图边长
+
+    Returns:
+        灰度缩略图 (size, size) uint8
+    """
+    small = cv2.resize(bgra, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY)
+
+
+def gray_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    计算两张灰度图的相似度（与 frame_similarity 相同的平均绝对差度量）
+
+    Returns:
+        相似度 0~1，1表示完全相同
+    """
+    diff = np.abs(a.astype(np.int16) - b)
+    return 1.0 - diff.mean() / 255.0
+
+
 def cvt_gray(frame: np.ndarray) -> np.ndarray:
-    """转换为灰度图"""
-    if len(frame.shape) == 3:
-        return np.mean(frame, axis=2).astype(np.uint8)
+    """转换为灰度图（BGR输入，整数亮度公式，不产生float64中间数组）"""
+    if frame.ndim == 3:
+        return bgr_to_gray(frame, np.empty(frame.shape[:2], dtype=np.uint8))
     return frame
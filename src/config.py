@@ -1,7 +1,9 @@
 """
 配置文件
 """
-import os
+from pathlib import Path
+
+import numpy as np
 
 # 游戏窗口配置
 WINDOW_TITLE = "魔塔"
@@ -21,8 +23,21 @@ MAP_REGION = {
     'y_end': 412,    # 地图区域结束Y坐标
 }
 
-# 游戏元素颜色 (HSV范围)
-COLORS = {
+# 左侧状态栏中各数值的位置 (x, y, 宽, 高)，用于数字模板识别
+# 需要根据实际游戏界面调整
+STATS_REGIONS = {
+    'floor': (40, 12, 80, 20),
+    'hp': (40, 60, 90, 20),
+    'atk': (40, 90, 90, 20),
+    'defense': (40, 120, 90, 20),
+    'gold': (40, 150, 90, 20),
+    'yellow_keys': (40, 200, 60, 20),
+    'blue_keys': (40, 230, 60, 20),
+    'red_keys': (40, 260, 60, 20),
+}
+
+# 游戏元素颜色 (HSV范围)，列表形式，供界面/调试查看
+COLORS_RAW = {
     'player': {
         'lower': [100, 80, 80],
         'upper': [130, 255, 255]
@@ -53,6 +68,12 @@ COLORS = {
     },
 }
 
+# 预先转换好的 (lower, upper) uint8 数组，可直接传给 cv2.inRange，避免每帧重新分配
+COLORS = {
+    name: (np.array(v['lower'], dtype=np.uint8), np.array(v['upper'], dtype=np.uint8))
+    for name, v in COLORS_RAW.items()
+}
+
 # 检测阈值
 DETECTION = {
     'template_match_threshold': 0.8,  # 模板匹配相似度阈值
@@ -98,13 +119,34 @@ DEBUG = {
 # 文件路径
 PATHS = {
     'template_dir': 'data/templates',
+    'digit_dir': 'data/digits',  # 数字模板 0.png ~ 9.png（灰度，尺寸一致）
     'monster_data': 'data/monsters.json',
     'log_dir': 'logs',
 }
 
-# 确保目录存在
-for path in PATHS.values():
-    if path.endswith('s') or 'dir' in path or 'log' in path:
-        os.makedirs(path, exist_ok=True)
+# PATHS 中表示目录的键（其余为文件路径，只需创建其父目录）
+_IS_DIR = {'template_dir', 'digit_dir', 'log_dir'}
+
+
+def ensure_path_for(key: str) -> Path:
+    """
+    确保 PATHS[key] 所需的目录存在
+
+    Args:
+        key: PATHS 中的键
+
+    Returns:
+        对应的路径
+    """
+    path = Path(PATHS[key])
+    if key in _IS_DIR:
+        path.mkdir(parents=True, exist_ok=True)
     else:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def ensure_paths():
+    """确保所有配置路径所需的目录存在（程序启动时调用一次）"""
+    for key in PATHS:
+        ensure_path_for(key)
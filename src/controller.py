@@ -4,6 +4,10 @@
 """
 import pyautogui
 import time
+import ctypes
+import atexit
+from collections import deque
+import numpy as np
 from typing import Optional, Set
 from enum import Enum
 import win32gui
@@ -12,12 +16,97 @@ import win32con
 from planner import Action
 
 
+_high_res_timer_enabled = False
+
+# ===== SendInput 键盘输入（绕过 pyautogui 的逐次查表和结构体构造）=====
+
+# 虚拟键码
+VK_CODES = {
+    'up': 0x26,
+    'down': 0x28,
+    'left': 0x25,
+    'right': 0x27,
+    'space': 0x20,
+    'enter': 0x0D,
+    'esc': 0x1B,
+}
+# 方向键属于扩展键
+_EXTENDED_KEYS = {'up', 'down', 'left', 'right'}
+
+_INPUT_KEYBOARD = 1
+_KEYEVENTF_EXTENDEDKEY = 0x0001
+_KEYEVENTF_KEYUP = 0x0002
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [('wVk', ctypes.c_ushort),
+                ('wScan', ctypes.c_ushort),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    # 仅用于保证 INPUT 联合体大小正确
+    _fields_ = [('dx', ctypes.c_long),
+                ('dy', ctypes.c_long),
+                ('mouseData', ctypes.c_ulong),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('ki', _KEYBDINPUT), ('mi', _MOUSEINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_ulong), ('u', _INPUTUNION)]
+
+
+def _build_key_inputs(key: str) -> tuple:
+    """预先构造某个键的按下/释放 INPUT 结构体"""
+    flags = _KEYEVENTF_EXTENDEDKEY if key in _EXTENDED_KEYS else 0
+    down = _INPUT(type=_INPUT_KEYBOARD)
+    down.u.ki = _KEYBDINPUT(wVk=VK_CODES[key], dwFlags=flags)
+    up = _INPUT(type=_INPUT_KEYBOARD)
+    up.u.ki = _KEYBDINPUT(wVk=VK_CODES[key], dwFlags=flags | _KEYEVENTF_KEYUP)
+    return down, up
+
+
+def _enable_high_res_timer():
+    """将Windows计时器精度提高到1ms（默认约15.6ms），进程退出时恢复"""
+    global _high_res_timer_enabled
+    if _high_res_timer_enabled or not hasattr(ctypes, 'windll'):
+        return
+    winmm = ctypes.windll.winmm
+    winmm.timeBeginPeriod(1)
+    atexit.register(winmm.timeEndPeriod, 1)
+    _high_res_timer_enabled = True
+
+
+def _sleep_until(deadline: float):
+    """
+    等待到指定时间点（time.perf_counter() 时间轴）
+
+    先用 time.sleep 睡到截止前约1ms，再短暂自旋，
+    避免 sleep 精度不足造成的延迟累积
+    """
+    remaining = deadline - time.perf_counter() - 0.001
+    if remaining > 0:
+        time.sleep(remaining)
+    while time.perf_counter() < deadline:
+        pass
+
+
 class Controller:
     """游戏控制器"""
 
     # 默认设置
     DEFAULT_KEY_DELAY = 0.05  # 按键间隔（秒）
     DEFAULT_ACTION_DELAY = 0.2  # 动作完成后等待时间（秒）
+    APS_WINDOW = 10.0  # 动作速度统计窗口（秒）
+    HWND_CACHE_TTL = 5.0  # 窗口句柄缓存时间（秒）
 
     def __init__(self, key_delay: float = None, action_delay: float = None, window_title: str = "魔塔"):
         """
@@ -30,10 +119,19 @@ class Controller:
         """
         # 禁用pyautogui的安全检查（需要快速输入时）
         pyautogui.FAILSAFE = False
+        # pyautogui 默认每次调用后额外睡眠0.1秒，按键节奏由控制器自己的
+        # key_delay/action_delay 负责，这里关掉
+        pyautogui.PAUSE = 0
 
         self.key_delay = key_delay if key_delay is not None else self.DEFAULT_KEY_DELAY
         self.action_delay = action_delay if action_delay is not None else self.DEFAULT_ACTION_DELAY
         self.window_title = window_title
+        self._hwnd = None  # 缓存的游戏窗口句柄
+        self._hwnd_checked_at = 0.0  # 上次查找窗口的时间（monotonic）
+
+        # 计时：提高系统计时器精度，按键间隔按截止时间调度而不是每次按键后睡眠
+        _enable_high_res_timer()
+        self._next_key_time = 0.0  # 下一次允许按键的时间点（perf_counter）
 
         # 按键映射
         self.key_map = {
@@ -45,9 +143,56 @@ class Controller:
             Action.SHOP: 'space',
         }
 
+        # 预构造所有按键的 INPUT 结构体，按键时直接调用 SendInput
+        # 非Windows环境或未收录的键退回 pyautogui
+        if hasattr(ctypes, 'windll'):
+            self._send_input = ctypes.windll.user32.SendInput
+            self._key_inputs = {key: _build_key_inputs(key) for key in VK_CODES}
+        else:
+            self._send_input = None
+            self._key_inputs = {}
+        self._input_size = ctypes.sizeof(_INPUT)
+
         # 统计信息
         self.total_actions = 0
-        self.action_history: list = []
+        # 只保留统计窗口内的动作记录 (time, action)，过期记录从左侧弹出
+        self.action_history: deque = deque()
+
+    def _find_hwnd(self) -> Optional[int]:
+        """
+        查找游戏窗口句柄（带缓存）
+
+        缓存的句柄仍然有效且未过期时直接返回，避免每次都枚举所有顶层窗口
+        """
+        now = time.monotonic()
+        if (self._hwnd and now - self._hwnd_checked_at < self.HWND_CACHE_TTL
+                and win32gui.IsWindow(self._hwnd)):
+            return self._hwnd
+
+        # 查找游戏窗口
+        hwnd = win32gui.FindWindow(None, self.window_title)
+
+        if not hwnd:
+            # 尝试模糊匹配
+            def window_callback(hwnd, windows):
+                if win32gui.IsWindowVisible(hwnd):
+                    title = win32gui.GetWindowText(hwnd)
+                    if self.window_title in title:
+                        windows.append(hwnd)
+                return True
+
+            windows = []
+            win32gui.EnumWindows(window_callback, windows)
+            hwnd = windows[0] if windows else None
+
+        self._hwnd = hwnd
+        self._hwnd_checked_at = now
+        return hwnd
+
+    def invalidate_hwnd(self):
+        """清除缓存的窗口句柄（窗口重建或更换时调用）"""
+        self._hwnd = None
+        self._hwnd_checked_at = 0.0
 
     def activate_window(self) -> bool:
         """
@@ -57,26 +202,10 @@ class Controller:
             是否成功激活
         """
         try:
-            # 查找游戏窗口
-            hwnd = win32gui.FindWindow(None, self.window_title)
-
+            hwnd = self._find_hwnd()
             if not hwnd:
-                # 尝试模糊匹配
-                def window_callback(hwnd, windows):
-                    if win32gui.IsWindowVisible(hwnd):
-                        title = win32gui.GetWindowText(hwnd)
-                        if self.window_title in title:
-                            windows.append(hwnd)
-                    return True
-
-                windows = []
-                win32gui.EnumWindows(window_callback, windows)
-
-                if windows:
-                    hwnd = windows[0]
-                else:
-                    print(f"警告: 未找到窗口 '{self.window_title}'")
-                    return False
+                print(f"警告: 未找到窗口 '{self.window_title}'")
+                return False
 
             # 激活窗口
             win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
@@ -88,6 +217,7 @@ class Controller:
             return True
 
         except Exception as e:
+            self.invalidate_hwnd()
             print(f"激活窗口失败: {e}")
             return False
 
@@ -99,10 +229,22 @@ class Controller:
             key: 按键名称
             duration: 按住持续时间
         """
-        pyautogui.keyDown(key)
-        time.sleep(duration)
-        pyautogui.keyUp(key)
-        time.sleep(self.key_delay)
+        # 距上一次按键不足 key_delay 时才等待
+        _sleep_until(self._next_key_time)
+
+        inputs = self._key_inputs.get(key)
+        key_down_time = time.perf_counter()
+        if inputs:
+            down, up = inputs
+            self._send_input(1, ctypes.byref(down), self._input_size)
+            _sleep_until(key_down_time + duration)
+            self._send_input(1, ctypes.byref(up), self._input_size)
+        else:
+            pyautogui.keyDown(key)
+            _sleep_until(key_down_time + duration)
+            pyautogui.keyUp(key)
+
+        self._next_key_time = time.perf_counter() + self.key_delay
 
     def execute(self, action: Action, repeats: int = 1, activate: bool = True) -> bool:
         """
@@ -126,17 +268,17 @@ class Controller:
             # if activate and hasattr(self, 'window_title'):
             #     self.activate_window()
 
+            # 重复按键之间只有 key_delay 间隔，action_delay 只在最后等待一次
             for _ in range(repeats):
                 self.press_key(key)
 
-            self.total_actions += 1
-            self.action_history.append({
-                'action': action,
-                'time': time.time()
-            })
+            self.total_actions += repeats
+            now = time.monotonic()
+            self._prune_action_history(now)
+            self.action_history.extend([(now, action)] * repeats)
 
             # 动作完成后等待
-            time.sleep(self.action_delay)
+            _sleep_until(time.perf_counter() + self.action_delay)
 
             return True
 
@@ -144,6 +286,15 @@ class Controller:
             print(f"执行动作失败: {e}")
             return False
 
+    @staticmethod
+    def _direction_action(dx: int, dy: int) -> Optional[Action]:
+        """根据位移确定移动方向（每次只移动一格），无位移返回None"""
+        if dx == 0 and dy == 0:
+            return None
+        if abs(dx) > abs(dy):
+            return Action.RIGHT if dx > 0 else Action.LEFT
+        return Action.DOWN if dy > 0 else Action.UP
+
     def move_to(self, target_x: int, target_y: int,
                 current_x: int, current_y: int) -> bool:
         """
@@ -158,17 +309,10 @@ class Controller:
         Returns:
             是否移动成功
         """
-        dx, dy = target_x - current_x, target_y - current_y
-
-        if dx == 0 and dy == 0:
+        action = self._direction_action(target_x - current_x, target_y - current_y)
+        if action is None:
             return True
 
-        # 确定移动方向（每次只移动一格）
-        if abs(dx) > abs(dy):
-            action = Action.RIGHT if dx > 0 else Action.LEFT
-        else:
-            action = Action.DOWN if dy > 0 else Action.UP
-
         return self.execute(action)
 
     def move_path(self, path: list[tuple[int, int]],
@@ -176,6 +320,9 @@ class Controller:
         """
         沿着路径移动
 
+        连续同方向的步骤合并为一次 execute(action, repeats=n)，
+        只在每段结束后等待一次 action_delay
+
         Args:
             path: 路径点列表 [(x, y), ...]
             current_x: 当前X坐标
@@ -184,10 +331,21 @@ class Controller:
         Returns:
             是否移动成功
         """
-        for pos in path:
-            if not self.move_to(pos[0], pos[1], current_x, current_y):
+        # 游程编码: [(action, count), ...]
+        runs: list[list] = []
+        for x, y in path:
+            action = self._direction_action(x - current_x, y - current_y)
+            current_x, current_y = x, y
+            if action is None:
+                continue
+            if runs and runs[-1][0] == action:
+                runs[-1][1] += 1
+            else:
+                runs.append([action, 1])
+
+        for action, count in runs:
+            if not self.execute(action, repeats=count):
                 return False
-            current_x, current_y = pos
 
         return True
 
@@ -244,20 +402,22 @@ class Controller:
         """获取已执行的动作总数"""
         return self.total_actions
 
+    def _prune_action_history(self, now: float):
+        """移除统计窗口之外的动作记录"""
+        history = self.action_history
+        while history and now - history[0][0] >= self.APS_WINDOW:
+            history.popleft()
+
     def get_actions_per_second(self) -> float:
         """获取每秒动作数"""
-        if not self.action_history:
-            return 0.0
-
-        now = time.time()
         # 统计最近10秒的动作数
-        recent = [a for a in self.action_history if now - a['time'] < 10]
-        return len(recent) / 10.0
+        self._prune_action_history(time.monotonic())
+        return len(self.action_history) / self.APS_WINDOW
 
     def reset_stats(self):
         """重置统计信息"""
         self.total_actions = 0
-        self.action_history = []
+        self.action_history.clear()
 
 
 class SmartController(Controller):
@@ -317,17 +477,34 @@ class SmartController(Controller):
         return True
 
 
+# 录制事件格式：相对时间戳（秒）+ 动作编号
+REPLAY_DTYPE = np.dtype([('t', 'f8'), ('a', 'u1')])
+# 动作编号 <-> 动作，编号即 Action 的定义顺序
+REPLAY_ACTIONS = list(Action)
+REPLAY_ACTION_CODES = {action: i for i, action in enumerate(REPLAY_ACTIONS)}
+
+
 class ReplayRecorder:
     """操作录制器"""
 
+    INITIAL_CAPACITY = 1024  # 初始事件容量，不够时翻倍
+
     def __init__(self):
-        self.recording: list[dict] = []
+        self._events = np.empty(self.INITIAL_CAPACITY, dtype=REPLAY_DTYPE)
+        self._count = 0
+        self._t0 = 0.0  # 录制开始的 perf_counter 时间
         self.start_time = None
         self.is_recording = False
 
+    @property
+    def recording(self) -> np.ndarray:
+        """已录制的事件（结构化数组视图）"""
+        return self._events[:self._count]
+
     def start(self):
         """开始录制"""
-        self.recording = []
+        self._count = 0
+        self._t0 = time.perf_counter()
         self.start_time = time.time()
         self.is_recording = True
 
@@ -341,11 +518,14 @@ class ReplayRecorder:
         if not self.is_recording:
             return
 
-        timestamp = time.time() - self.start_time
-        self.recording.append({
-            'timestamp': timestamp,
-            'action': action
-        })
+        if self._count == len(self._events):
+            # 容量不足，翻倍扩容
+            grown = np.empty(len(self._events) * 2, dtype=REPLAY_DTYPE)
+            grown[:self._count] = self._events
+            self._events = grown
+
+        self._events[self._count] = (time.perf_counter() - self._t0, REPLAY_ACTION_CODES[action])
+        self._count += 1
 
     def stop(self):
         """停止录制"""
@@ -353,7 +533,18 @@ class ReplayRecorder:
 
     def save(self, filepath: str):
         """
-        保存录制到文件
+        保存录制到文件（NumPy压缩格式 .npz）
+
+        Args:
+            filepath: 文件路径
+        """
+        with open(filepath, 'wb') as f:
+            np.savez_compressed(f, events=self.recording,
+                                start_time=np.float64(self.start_time or 0.0))
+
+    def save_json(self, filepath: str):
+        """
+        保存录制到JSON文件（旧格式，便于人工查看）
 
         Args:
             filepath: 文件路径
@@ -363,22 +554,41 @@ class ReplayRecorder:
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump({
                 'start_time': self.start_time,
-                'actions': self.recording
+                'actions': [
+                    {'timestamp': float(t), 'action': REPLAY_ACTIONS[a].value}
+                    for t, a in self.recording
+                ]
             }, f, indent=2)
 
+    def _set_events(self, events: np.ndarray):
+        """替换录制内容"""
+        self._events = np.array(events, dtype=REPLAY_DTYPE)
+        self._count = len(self._events)
+        if len(self._events) == 0:
+            self._events = np.empty(self.INITIAL_CAPACITY, dtype=REPLAY_DTYPE)
+
     def load(self, filepath: str):
         """
-        从文件加载录制
+        从文件加载录制（.json 为旧格式，其余按 .npz 读取）
 
         Args:
             filepath: 文件路径
         """
-        import json
+        if filepath.endswith('.json'):
+            import json
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
             self.start_time = data['start_time']
-            self.recording = data['actions']
+            self._set_events([
+                (a['timestamp'], REPLAY_ACTION_CODES[Action(a['action'])])
+                for a in data['actions']
+            ])
+            return
+
+        with np.load(filepath) as data:
+            self.start_time = float(data['start_time'])
+            self._set_events(data['events'])
 
 
 class ReplayPlayer:
@@ -386,7 +596,7 @@ class ReplayPlayer:
 
     def __init__(self, controller: Controller):
         self.controller = controller
-        self.recording: list[dict] = []
+        self.recording = np.empty(0, dtype=REPLAY_DTYPE)
         self.start_time = None
 
     def load(self, filepath: str):
@@ -405,24 +615,18 @@ class ReplayPlayer:
         Returns:
             是否播放成功
         """
-        if not self.recording:
+        if len(self.recording) == 0:
             print("没有可回放的录制")
             return False
 
-        self.start_time = time.time()
-        last_timestamp = 0
+        # 按相对开始时间的绝对截止时间调度，执行耗时不会逐条累积成漂移
+        self.start_time = time.perf_counter()
 
-        for record in self.recording:
-            # 计算等待时间
-            delay = (record['timestamp'] - last_timestamp) / speed
-            if delay > 0:
-                time.sleep(delay)
+        for t, a in zip(self.recording['t'].tolist(), self.recording['a'].tolist()):
+            _sleep_until(self.start_time + t / speed)
 
             # 执行动作
-            action = Action(record['action'])
-            self.controller.execute(action)
-
-            last_timestamp = record['timestamp']
+            self.controller.execute(REPLAY_ACTIONS[a])
 
         return True
 
@@ -6,9 +6,11 @@ import cv2
 import numpy as np
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional, Dict
-from dataclasses import dataclass
-from config import MAP_REGION
+from dataclasses import dataclass, field
+from config import MAP_REGION, COLORS, PATHS, STATS_REGIONS
+from fastcvt import HAS_NUMBA, grid_candidates, hsv_range_bits
 
 
 @dataclass
@@ -64,6 +66,16 @@ class PlayerInfo:
     y: int
 
 
+@dataclass
+class FrameDetections:
+    """一帧画面的识别结果"""
+    player: Optional[Point]
+    monsters: List[Monster] = field(default_factory=list)
+    doors: List[Door] = field(default_factory=list)
+    keys: List[Key] = field(default_factory=list)
+    stairs: Dict[str, Optional[Point]] = field(default_factory=lambda: {'up': None, 'down': None})
+
+
 class GameElementDetector:
     """游戏元素检测器"""
 
@@ -80,17 +92,49 @@ class GameElementDetector:
     # 游戏网格设置
     GRID_SIZE = 32  # 每个格子的大小（像素）
 
-    def __init__(self, template_dir: str = "data/templates"):
+    # 怪物模板匹配：先在缩小 PYRAMID_LEVELS 级的画面上粗筛，再在原图上复核
+    PYRAMID_LEVELS = 1
+    COARSE_MATCH_THRESHOLD = 0.6
+
+    # 状态栏数字模板匹配阈值
+    DIGIT_MATCH_THRESHOLD = 0.8
+
+    def __init__(self, template_dir: str = "data/templates", use_opencl: Optional[bool] = None):
         """
         初始化检测器
 
         Args:
             template_dir: 模板图片目录
+            use_opencl: 是否通过 UMat 使用OpenCL加速（None表示有可用设备时自动启用）
         """
         self.template_dir = template_dir
+        if use_opencl is None:
+            use_opencl = cv2.ocl.haveOpenCL()
+        self.use_opencl = bool(use_opencl)
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
         self.monster_templates: Dict[str, np.ndarray] = {}
+        # 按形状分组并堆叠的模板: shape -> (名称列表, (N, H, W, C) 连续数组)
+        self._template_bank: Dict[Tuple[int, ...], Tuple[List[str], np.ndarray]] = {}
+        # 金字塔粗匹配用的缩小模板: shape -> [ndarray 或 UMat, ...]（与 _template_bank 下标对应）
+        self._coarse_templates: Dict[Tuple[int, ...], list] = {}
         self.monster_data: Dict[str, Dict] = {}
+        # 门/钥匙颜色范围的按位查找表，以及按位序排列的范围下限和宽度（供JIT内核使用）
+        ranges = [COLORS[f'{color}_{kind}'] for kind in ('door', 'key') for color in self.DOOR_KEY_COLORS]
+        self._hsv_lut, self._range_bits = _build_hsv_lut(ranges)
+        unique_ranges = list({_range_key(lower, upper): (lower, upper) for lower, upper in ranges}.values())
+        self._range_lowers = np.array([lower for lower, _ in unique_ranges], dtype=np.uint8)
+        self._range_spans = np.array([upper - lower for lower, upper in unique_ranges], dtype=np.uint8)
+        # 逐帧复用的临时缓冲区（HSV、掩码等），按名称索引
+        self._buffers: Dict[str, np.ndarray] = {}
+        # 状态栏数字模板 (10, H, W) 灰度，缺失时为None
+        self._digit_templates: Optional[np.ndarray] = None
+        # detect_all 中与门/钥匙/楼梯检测并行的怪物模板匹配线程（OpenCL模式下不使用）
+        self._monster_pool: Optional[ThreadPoolExecutor] = None
+        if not self.use_opencl:
+            self._monster_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detect-monsters')
         self._load_templates()
+        self._load_digit_templates()
         self._load_monster_data()
 
     def _load_templates(self):
@@ -100,13 +144,80 @@ class GameElementDetector:
             print(f"创建模板目录: {self.template_dir}")
             return
 
-        for filename in os.listdir(self.template_dir):
-            if filename.endswith('.png'):
-                name = filename[:-4]
-                template = cv2.imread(os.path.join(self.template_dir, filename))
-                if template is not None:
-                    self.monster_templates[name] = template
-                    print(f"加载模板: {name}")
+        with os.scandir(self.template_dir) as it:
+            paths = [entry.path for entry in it
+                     if entry.name.endswith('.png') and entry.is_file()]
+
+        # PNG解码时OpenCV会释放GIL，多线程并行读取
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            templates = list(executor.map(_read_image, paths))
+
+        for path, template in zip(paths, templates):
+            if template is not None:
+                name = os.path.basename(path)[:-4]
+                self.monster_templates[name] = template
+                print(f"加载模板: {name}")
+
+        self._build_template_bank()
+
+    def _build_template_bank(self):
+        """把同形状的模板堆叠成一个连续数组，匹配时按下标顺序遍历"""
+        groups: Dict[Tuple[int, ...], List[str]] = {}
+        for name, template in self.monster_templates.items():
+            groups.setdefault(template.shape, []).append(name)
+
+        self._template_bank = {
+            shape: (names, np.ascontiguousarray(np.stack([self.monster_templates[n] for n in names])))
+            for shape, names in groups.items()
+        }
+        self._coarse_templates = {
+            shape: [self._upload(self._pyr_down(t)) for t in bank]
+            for shape, (_, bank) in self._template_bank.items()
+        }
+
+    def _pyr_down(self, image):
+        """按 PYRAMID_LEVELS 逐级缩小（每级边长减半）"""
+        for _ in range(self.PYRAMID_LEVELS):
+            image = cv2.pyrDown(image)
+        return image
+
+    def _scratch(self, slot: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        取得复用的 uint8 临时缓冲区（尺寸变化时重新分配）
+
+        缓冲区内容只在当前检测调用中有效，下一次检测会被覆盖。
+
+        Args:
+            slot: 缓冲区名称
+            shape: 需要的形状
+
+        Returns:
+            缓冲区
+        """
+        buf = self._buffers.get(slot)
+        if buf is None or buf.shape != shape:
+            buf = self._buffers[slot] = np.empty(shape, dtype=np.uint8)
+        return buf
+
+    def _to_hsv(self, image: np.ndarray, slot: str):
+        """BGR -> HSV：启用OpenCL时在设备上转换，否则写入复用的缓冲区"""
+        if self.use_opencl:
+            return cv2.cvtColor(cv2.UMat(image), cv2.COLOR_BGR2HSV)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self._scratch(slot, image.shape))
+
+    def _upload(self, image: np.ndarray):
+        """启用OpenCL时把图像包装为 UMat，后续的OpenCV调用会在设备上执行"""
+        return cv2.UMat(image) if self.use_opencl else image
+
+    def _load_digit_templates(self):
+        """加载状态栏数字模板 0~9（全部存在且尺寸一致时才启用数字识别）"""
+        digit_dir = PATHS['digit_dir']
+        digits = [_read_image(os.path.join(digit_dir, f"{d}.png"), cv2.IMREAD_GRAYSCALE)
+                  for d in range(10)]
+        if any(d is None for d in digits) or len({d.shape for d in digits}) != 1:
+            return
+        self._digit_templates = np.stack(digits)
+        print("加载数字模板: 0-9")
 
     def _load_monster_data(self):
         """加载怪物数据库"""
@@ -116,24 +227,64 @@ class GameElementDetector:
                 self.monster_data = json.load(f)
             print(f"加载怪物数据: {len(self.monster_data)} 条")
 
-    def detect_player(self, frame: np.ndarray) -> Optional[Point]:
+    def detect_all(self, frame: np.ndarray) -> FrameDetections:
+        """
+        一次识别画面中的全部元素
+
+        整帧只做一次HSV转换，玩家、门和钥匙的检测共用；未检测到玩家时跳过其余检测。
+        怪物模板匹配（OpenCV会释放GIL，且不使用共享的临时缓冲区）在后台线程中
+        与门、钥匙、楼梯的检测同时进行。
+
+        Args:
+            frame: 游戏画面
+
+        Returns:
+            识别结果
+        """
+        hsv = self._to_hsv(frame, 'hsv')
+        player = self.detect_player(frame, hsv=hsv)
+        if player is None:
+            return FrameDetections(player=None)
+
+        monsters_future = None
+        if self._monster_pool is not None:
+            monsters_future = self._monster_pool.submit(self.detect_monsters, frame)
+
+        doors, keys = self._detect_doors_and_keys(frame, want_doors=True, want_keys=True, hsv=hsv)
+        stairs = self.detect_stairs(frame)
+        monsters = monsters_future.result() if monsters_future else self.detect_monsters(frame)
+        return FrameDetections(
+            player=player,
+            monsters=monsters,
+            doors=doors,
+            keys=keys,
+            stairs=stairs
+        )
+
+    def detect_player(self, frame: np.ndarray,
+                      hsv: Optional[np.ndarray] = None) -> Optional[Point]:
         """
         检测玩家位置
 
         Args:
             frame: 游戏画面
+            hsv: 整帧的HSV图像（可选，已转换过时传入，避免重复转换）
 
         Returns:
             玩家坐标 (网格坐标)
         """
         # 魔塔中玩家通常是蓝色的圆形或人形
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        if hsv is None:
+            hsv = self._to_hsv(frame, 'hsv')
 
         # 蓝色范围 (玩家衣服颜色)
-        lower_blue = np.array([100, 80, 80])
-        upper_blue = np.array([130, 255, 255])
+        lower_blue, upper_blue = COLORS['player']
 
-        mask = cv2.inRange(hsv, lower_blue, upper_blue)
+        if isinstance(hsv, cv2.UMat):
+            mask = cv2.inRange(hsv, lower_blue, upper_blue).get()
+        else:
+            mask = cv2.inRange(hsv, lower_blue, upper_blue,
+                               dst=self._scratch('player_mask', hsv.shape[:2]))
 
         # 查找轮廓
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -195,80 +346,91 @@ class GameElementDetector:
         x_end = min(x_end, w)
         y_end = min(y_end, h)
 
-        # 将地图区域分割成网格，逐个检测
-        map_width = x_end - x_start
-        map_height = y_end - y_start
-
-        rows = map_height // self.GRID_SIZE
-        cols = map_width // self.GRID_SIZE
-
-        for row in range(rows):
-            for col in range(cols):
-                # 计算完整画面中的格子坐标
-                x1 = x_start + col * self.GRID_SIZE
-                y1 = y_start + row * self.GRID_SIZE
-                x2 = x1 + self.GRID_SIZE
-                y2 = y1 + self.GRID_SIZE
-
-                # 确保不超出画面范围
-                if x2 > w or y2 > h:
-                    continue
-
-                cell = frame[y1:y2, x1:x2]
-
-                # 检查是否是怪物
-                monster = self._identify_monster(cell, col, row)
-                if monster:
-                    monsters.append(monster)
+        # 地图区域按网格对齐裁剪
+        rows = (y_end - y_start) // self.GRID_SIZE
+        cols = (x_end - x_start) // self.GRID_SIZE
+        if rows <= 0 or cols <= 0:
+            return monsters
+
+        map_frame = frame[y_start:y_start + rows * self.GRID_SIZE,
+                          x_start:x_start + cols * self.GRID_SIZE]
+
+        # 只有与格子同尺寸的模板参与匹配
+        shape = (self.GRID_SIZE, self.GRID_SIZE, map_frame.shape[2])
+        names, bank = self._template_bank.get(shape, ([], None))
+        if not names:
+            return monsters
+
+        # 先在缩小的地图上用缩小的模板粗匹配，按（缩小后的）网格步长取出每个格子的得分
+        coarse = self._pyr_down(self._upload(map_frame))
+        coarse_templates = self._coarse_templates[shape]
+        step = self.GRID_SIZE >> self.PYRAMID_LEVELS
+
+        scores = np.empty((len(names), rows, cols), dtype=np.float32)
+        for i in range(len(names)):
+            result = _download(cv2.matchTemplate(coarse, coarse_templates[i], cv2.TM_CCOEFF_NORMED))
+            scores[i] = result[::step, ::step]
+
+        # 候选已按 行、列、模板序号 排好，与逐格扫描时的输出顺序一致
+        tpl_idx, row_idx, col_idx = grid_candidates(scores, self.COARSE_MATCH_THRESHOLD)
+
+        # 只对候选格子在原分辨率下复核；同一格子以先匹配到的模板为准
+        matched = np.zeros((rows, cols), dtype=bool)
+        for i, row, col in zip(tpl_idx.tolist(), row_idx.tolist(), col_idx.tolist()):
+            if matched[row, col]:
+                continue
+            y1 = row * self.GRID_SIZE
+            x1 = col * self.GRID_SIZE
+            cell = map_frame[y1:y1 + self.GRID_SIZE, x1:x1 + self.GRID_SIZE]
+            score = cv2.matchTemplate(cell, bank[i], cv2.TM_CCOEFF_NORMED)[0, 0]
+            if score > 0.8:  # 相似度阈值
+                matched[row, col] = True
+                monsters.append(self._make_monster(names[i], col, row))
 
         return monsters
 
-    def _identify_monster(self, cell: np.ndarray, x: int, y: int) -> Optional[Monster]:
+    def _make_monster(self, name: str, x: int, y: int) -> Monster:
         """
-        识别单个格子中的怪物
+        根据模板名称和怪物数据库构造怪物信息
 
         Args:
-            cell: 格子图像
+            name: 模板名称
             x: 网格X坐标
             y: 网格Y坐标
 
         Returns:
-            怪物信息或None
+            怪物信息（不带图标，需要时用 get_monster_icon 从画面中取）
         """
-        if cell.size == 0:
-            return None
+        data = self.monster_data.get(name, {})
+        return Monster(
+            x=x, y=y,
+            name=name,
+            atk=data.get('atk', 0),
+            defense=data.get('defense', 0),
+            hp=data.get('hp', 0),
+            gold=data.get('gold', 0),
+            exp=data.get('exp', 0)
+        )
 
-        # 方法1: 模板匹配
-        for name, template in self.monster_templates.items():
-            if template.shape[:2] != cell.shape[:2]:
-                continue
+    def get_monster_icon(self, frame: np.ndarray, monster: Monster) -> np.ndarray:
+        """
+        从画面中取出怪物所在格子的图像副本
+
+        Args:
+            frame: 检测该怪物时使用的游戏画面
+            monster: detect_monsters 返回的怪物（坐标相对地图区域）
 
-            # 计算相似度
-            result = cv2.matchTemplate(cell, template, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-
-            if max_val > 0.8:  # 相似度阈值
-                # 从数据库获取怪物属性
-                data = self.monster_data.get(name, {})
-                return Monster(
-                    x=x, y=y,
-                    name=name,
-                    atk=data.get('atk', 0),
-                    defense=data.get('defense', 0),
-                    hp=data.get('hp', 0),
-                    gold=data.get('gold', 0),
-                    exp=data.get('exp', 0),
-                    icon=cell.copy()
-                )
-
-        # 方法2: 颜色特征识别（备用方案）
-        # 怪物通常有特定的颜色组合
-        hsv = cv2.cvtColor(cell, cv2.COLOR_BGR2HSV)
-
-        # 检查是否是怪物区域（有特殊颜色）
-        # 这里可以根据具体游戏调整
+        Returns:
+            格子图像
+        """
+        y1 = MAP_REGION.get('y_start', 60) + monster.y * self.GRID_SIZE
+        x1 = MAP_REGION.get('x_start', 140) + monster.x * self.GRID_SIZE
+        return frame[y1:y1 + self.GRID_SIZE, x1:x1 + self.GRID_SIZE].copy()
 
-        return None
+    # 门和钥匙的颜色（对应 COLORS 中的 '<颜色>_door' / '<颜色>_key'）及面积范围
+    DOOR_KEY_COLORS = ('yellow', 'blue', 'red')
+    DOOR_AREA = (200, 800)
+    KEY_AREA = (50, 300)  # 钥匙的面积较小
 
     def detect_doors(self, frame: np.ndarray) -> List[Door]:
         """
@@ -280,67 +442,49 @@ class GameElementDetector:
         Returns:
             门列表
         """
-        doors = []
-
-        # 裁剪到地图区域（排除左右状态栏）
-        x_start = MAP_REGION.get('x_start', 140)
-        y_start = MAP_REGION.get('y_start', 60)
-        x_end = MAP_REGION.get('x_end', 558)
-        y_end = MAP_REGION.get('y_end', 412)
-
-        h, w = frame.shape[:2]
-        x_end = min(x_end, w)
-        y_end = min(y_end, h)
-
-        map_frame = frame[y_start:y_end, x_start:x_end]
-        if map_frame.size == 0:
-            return doors
+        return self._detect_doors_and_keys(frame, want_doors=True, want_keys=False)[0]
 
-        hsv = cv2.cvtColor(map_frame, cv2.COLOR_BGR2HSV)
-
-        # 定义不同颜色门的范围
-        door_colors = {
-            'yellow': (np.array([20, 100, 100]), np.array([40, 255, 255])),
-            'blue': (np.array([100, 50, 50]), np.array([130, 255, 255])),
-            'red': (np.array([0, 50, 50]), np.array([10, 255, 255])),
-        }
-
-        for color_name, (lower, upper) in door_colors.items():
-            mask = cv2.inRange(hsv, lower, upper)
-
-            # 查找轮廓
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            for contour in contours:
-                area = cv2.contourArea(contour)
+    def detect_keys(self, frame: np.ndarray) -> List[Key]:
+        """
+        检测画面中的所有钥匙（仅在地图区域内检测，排除状态栏）
 
-                # 门的面积应该在一定范围内
-                if 200 < area < 800:
-                    # 获取边界框
-                    x, y, w_box, h_box = cv2.boundingRect(contour)
+        Args:
+            frame: 游戏画面
 
-                    # 计算中心点（加上区域偏移）
-                    cx = x + w_box // 2 + x_start
-                    cy = y + h_box // 2 + y_start
+        Returns:
+            钥匙列表
+        """
+        return self._detect_doors_and_keys(frame, want_doors=False, want_keys=True)[1]
 
-                    # 转换为网格坐标
-                    grid_x = cx // self.GRID_SIZE
-                    grid_y = cy // self.GRID_SIZE
+    def detect_doors_and_keys(self, frame: np.ndarray) -> Tuple[List[Door], List[Key]]:
+        """
+        同时检测门和钥匙，共用一次HSV转换和颜色掩码
 
-                    doors.append(Door(x=grid_x, y=grid_y, color=color_name))
+        Args:
+            frame: 游戏画面
 
-        return doors
+        Returns:
+            (门列表, 钥匙列表)
+        """
+        return self._detect_doors_and_keys(frame, want_doors=True, want_keys=True)
 
-    def detect_keys(self, frame: np.ndarray) -> List[Key]:
+    def _detect_doors_and_keys(self, frame: np.ndarray, want_doors: bool, want_keys: bool,
+                               hsv: Optional[np.ndarray] = None) -> Tuple[List[Door], List[Key]]:
         """
-        检测画面中的所有钥匙（仅在地图区域内检测，排除状态栏）
+        在地图区域内按颜色检测门和钥匙
+
+        HSV只转换一次；所有颜色范围的判定通过一次查表完成，门和钥匙共用。
 
         Args:
             frame: 游戏画面
+            want_doors: 是否检测门
+            want_keys: 是否检测钥匙
+            hsv: 整帧的HSV图像（可选，传入时直接裁剪使用）
 
         Returns:
-            钥匙列表
+            (门列表, 钥匙列表)
         """
+        doors = []
         keys = []
 
         # 裁剪到地图区域（排除左右状态栏）
@@ -349,47 +493,92 @@ class GameElementDetector:
         x_end = MAP_REGION.get('x_end', 558)
         y_end = MAP_REGION.get('y_end', 412)
 
-        # 确保不超出画面范围
         h, w = frame.shape[:2]
         x_end = min(x_end, w)
         y_end = min(y_end, h)
 
-        # 裁剪到地图区域
         map_frame = frame[y_start:y_end, x_start:x_end]
         if map_frame.size == 0:
-            return keys
+            return doors, keys
+
+        if hsv is None:
+            hsv = self._to_hsv(map_frame, 'map_hsv')
+        elif isinstance(hsv, cv2.UMat):
+            hsv = cv2.UMat(hsv, (y_start, y_end), (x_start, x_end))
+        else:
+            hsv = hsv[y_start:y_end, x_start:x_end]
+        # 得到每个像素属于哪些颜色范围（按位打包），每个范围的掩码只需取对应的位
+        if HAS_NUMBA and not isinstance(hsv, cv2.UMat):
+            # JIT内核一次遍历完成所有范围的判定
+            packed = hsv_range_bits(hsv, self._range_lowers, self._range_spans,
+                                    self._scratch('packed', hsv.shape[:2]))
+        else:
+            h_bits, s_bits, v_bits = cv2.split(cv2.LUT(hsv, self._hsv_lut))
+            packed = _download(cv2.bitwise_and(cv2.bitwise_and(h_bits, s_bits), v_bits))
+
+        # 门和钥匙的颜色范围可能相同，同一范围的连通域只统计一次
+        blobs_by_range: Dict[bytes, np.ndarray] = {}
+
+        def blobs_for(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+            key = _range_key(lower, upper)
+            blobs = blobs_by_range.get(key)
+            if blobs is None:
+                mask = np.bitwise_and(packed, self._range_bits[key],
+                                      out=self._scratch('mask', packed.shape))
+                blobs = blobs_by_range[key] = self._blob_cells(mask, x_start, y_start)
+            return blobs
+
+        if want_doors:
+            for color_name in self.DOOR_KEY_COLORS:
+                blobs = blobs_for(*COLORS[f'{color_name}_door'])
+                for grid_x, grid_y in self._select_blobs(blobs, self.DOOR_AREA):
+                    doors.append(Door(x=grid_x, y=grid_y, color=color_name))
 
-        hsv = cv2.cvtColor(map_frame, cv2.COLOR_BGR2HSV)
+        if want_keys:
+            for color_name in self.DOOR_KEY_COLORS:
+                blobs = blobs_for(*COLORS[f'{color_name}_key'])
+                for grid_x, grid_y in self._select_blobs(blobs, self.KEY_AREA):
+                    keys.append(Key(x=grid_x, y=grid_y, color=color_name))
 
-        # 钥匙颜色范围（与门相同）
-        key_colors = {
-            'yellow': (np.array([20, 100, 100]), np.array([40, 255, 255])),
-            'blue': (np.array([100, 50, 50]), np.array([130, 255, 255])),
-            'red': (np.array([0, 50, 50]), np.array([10, 255, 255])),
-        }
+        return doors, keys
 
-        for color_name, (lower, upper) in key_colors.items():
-            mask = cv2.inRange(hsv, lower, upper)
+    def _blob_cells(self, mask: np.ndarray, x_offset: int, y_offset: int) -> np.ndarray:
+        """
+        统计掩码中的所有色块，返回每个色块的面积和中心所在的网格坐标
 
-            # 查找轮廓
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        Args:
+            mask: 二值掩码（地图区域）
+            x_offset: 地图区域在完整画面中的X偏移
+            y_offset: 地图区域在完整画面中的Y偏移
 
-            for contour in contours:
-                area = cv2.contourArea(contour)
+        Returns:
+            (N, 3) 数组，每行为 [面积, grid_x, grid_y]
+        """
+        # 一次调用得到所有连通域的面积和边界框，坐标换算用向量运算
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        stats = stats[1:]  # 去掉背景
 
-                # 钥匙的面积较小
-                if 50 < area < 300:
-                    x, y, w_box, h_box = cv2.boundingRect(contour)
-                    cx = x + w_box // 2
-                    cy = y + h_box // 2
+        # 边界框中心（加上区域偏移）转换为网格坐标
+        cx = stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH] // 2 + x_offset
+        cy = stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT] // 2 + y_offset
+        return np.stack([stats[:, cv2.CC_STAT_AREA], cx // self.GRID_SIZE, cy // self.GRID_SIZE], axis=1)
 
-                    # 转换为完整画面的网格坐标（加上区域偏移）
-                    grid_x = (cx + x_start) // self.GRID_SIZE
-                    grid_y = (cy + y_start) // self.GRID_SIZE
+    @staticmethod
+    def _select_blobs(blobs: np.ndarray, area_range: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """
+        按面积筛选 _blob_cells 的结果
 
-                    keys.append(Key(x=grid_x, y=grid_y, color=color_name))
+        Args:
+            blobs: _blob_cells 返回的 (N, 3) 数组
+            area_range: (面积下限, 面积上限)，均不含
 
-        return keys
+        Returns:
+            [(grid_x, grid_y), ...]
+        """
+        min_area, max_area = area_range
+        areas = blobs[:, 0]
+        selected = blobs[(areas > min_area) & (areas < max_area)]
+        return list(zip(selected[:, 1].tolist(), selected[:, 2].tolist()))
 
     def detect_stairs(self, frame: np.ndarray) -> Dict[str, Optional[Point]]:
         """
@@ -421,10 +610,11 @@ class GameElementDetector:
         # 上楼楼梯：通常在上方，箭头向上
         # 下楼楼梯：通常在下方，箭头向下
 
-        gray = cv2.cvtColor(map_frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(map_frame, cv2.COLOR_BGR2GRAY,
+                            dst=self._scratch('gray', map_frame.shape[:2]))
 
         # 使用边缘检测
-        edges = cv2.Canny(gray, 50, 150)
+        edges = cv2.Canny(gray, 50, 150, edges=self._scratch('edges', gray.shape))
 
         # 查找轮廓
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -461,32 +651,82 @@ class GameElementDetector:
         Returns:
             玩家信息
         """
-        # 状态栏通常在顶部或底部
-        h, w = frame.shape[:2]
-
-        # 假设状态栏在顶部，高度约60像素
-        stats_region = frame[0:60, :]
-
-        # 使用OCR识别文字（需要安装pytesseract）
-        # 或者通过固定位置解析
+        # 默认值（没有数字模板或某项识别失败时使用）
+        stats = {
+            'floor': 1,
+            'hp': 1000,
+            'atk': 10,
+            'defense': 10,
+            'yellow_keys': 1,
+            'blue_keys': 0,
+            'red_keys': 0,
+            'gold': 0,
+        }
 
-        # 这里简化处理，返回默认值
-        # 实际使用时需要根据具体游戏界面调整
+        # 按固定位置用数字模板识别各项数值
+        if self._digit_templates is not None:
+            for name, (x, y, w_box, h_box) in STATS_REGIONS.items():
+                roi = frame[y:y + h_box, x:x + w_box]
+                if roi.size == 0:
+                    continue
+                value = self._read_number(cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY))
+                if value is not None:
+                    stats[name] = value
 
         return PlayerInfo(
-            floor=1,
-            hp=1000,
-            max_hp=1000,
-            atk=10,
-            defense=10,
-            yellow_keys=1,
-            blue_keys=0,
-            red_keys=0,
-            gold=0,
+            floor=stats['floor'],
+            hp=stats['hp'],
+            max_hp=stats['hp'],
+            atk=stats['atk'],
+            defense=stats['defense'],
+            yellow_keys=stats['yellow_keys'],
+            blue_keys=stats['blue_keys'],
+            red_keys=stats['red_keys'],
+            gold=stats['gold'],
             x=0,
             y=0
         )
 
+    def _read_number(self, gray: np.ndarray) -> Optional[int]:
+        """
+        用数字模板识别灰度图中的一串数字
+
+        每个数字模板在整个区域上匹配一次，按列取各数字的最高分；
+        再从高分到低分选取互不重叠的位置，按从左到右拼成数字。
+
+        Args:
+            gray: 数值区域灰度图
+
+        Returns:
+            识别出的整数，没有识别到数字时为None
+        """
+        digit_h, digit_w = self._digit_templates.shape[1:]
+        if gray.shape[0] < digit_h or gray.shape[1] < digit_w:
+            return None
+
+        # (10, 列数)：每个数字在每个横向位置上的最高分
+        scores = np.stack([
+            cv2.matchTemplate(gray, digit, cv2.TM_CCOEFF_NORMED).max(axis=0)
+            for digit in self._digit_templates
+        ])
+        best_digit = scores.argmax(axis=0)
+        best_score = scores.max(axis=0)
+
+        taken = np.zeros(best_score.shape[0], dtype=bool)
+        found = []
+        for x in np.argsort(best_score)[::-1]:
+            if best_score[x] < self.DIGIT_MATCH_THRESHOLD:
+                break
+            if taken[x]:
+                continue
+            found.append((x, best_digit[x]))
+            taken[max(0, x - digit_w + 1):x + digit_w] = True
+
+        if not found:
+            return None
+        found.sort()
+        return int(''.join(str(d) for _, d in found))
+
     def parse_monster_dialog(self, frame: np.ndarray) -> Optional[Dict]:
         """
         解析战斗对话框中的怪物信息
@@ -509,12 +749,20 @@ class GameElementDetector:
 
         return None
 
-    def build_grid_map(self, frame: np.ndarray) -> np.ndarray:
+    def build_grid_map(self, frame: np.ndarray,
+                       monsters: Optional[List[Monster]] = None,
+                       doors: Optional[List[Door]] = None,
+                       keys: Optional[List[Key]] = None,
+                       stairs: Optional[Dict[str, Optional[Point]]] = None) -> np.ndarray:
         """
         将游戏画面转换为网格地图
 
         Args:
             frame: 游戏画面
+            monsters: 已检测到的怪物
+            doors: 已检测到的门
+            keys: 已检测到的钥匙
+            stairs: 已检测到的楼梯
 
         Returns:
             网格地图数组
@@ -525,14 +773,110 @@ class GameElementDetector:
         cols = w // self.GRID_SIZE
 
         grid_map = np.zeros((rows, cols), dtype=int)
-
-        # 识别各种元素并标记
-        # 这里简化处理
-        # 实际使用时需要调用上面的检测方法
+        fill_grid(grid_map, monsters or [], doors or [], keys or [], stairs or {})
 
         return grid_map
 
 
+def fill_grid(grid: np.ndarray, monsters: List[Monster], doors: List[Door],
+              keys: List[Key], stairs: Dict[str, Optional[Point]]) -> np.ndarray:
+    """
+    把检测到的元素一次性写入网格地图（越界的元素忽略）
+
+    所有元素的坐标和类型先拼成数组，再用一次花式索引赋值写入；
+    同一格子有多个元素时，以 怪物 < 门 < 钥匙 < 楼梯 的顺序后写覆盖先写。
+
+    Args:
+        grid: 网格地图 (rows, cols)，原地修改
+        monsters: 怪物列表
+        doors: 门列表
+        keys: 钥匙列表
+        stairs: {'up': Point或None, 'down': Point或None}
+
+    Returns:
+        grid
+    """
+    stair_points = [p for p in (stairs.get('up'), stairs.get('down')) if p]
+    objects = [*monsters, *doors, *keys, *stair_points]
+    if not objects:
+        return grid
+
+    count = len(objects)
+    xs = np.fromiter((o.x for o in objects), dtype=np.intp, count=count)
+    ys = np.fromiter((o.y for o in objects), dtype=np.intp, count=count)
+    types = np.concatenate([
+        np.full(len(monsters), 3),
+        np.full(len(doors), 2),
+        np.full(len(keys), 4),
+        np.full(len(stair_points), 5),
+    ])
+
+    rows, cols = grid.shape
+    inside = (xs >= 0) & (xs < cols) & (ys >= 0) & (ys < rows)
+    grid[ys[inside], xs[inside]] = types[inside]
+    return grid
+
+
+def _range_key(lower: np.ndarray, upper: np.ndarray) -> bytes:
+    """颜色范围的哈希键"""
+    return lower.tobytes() + upper.tobytes()
+
+
+def _build_hsv_lut(ranges: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, Dict[bytes, int]]:
+    """
+    为若干HSV颜色范围构建按通道的位查找表
+
+    第 i 个（去重后的）范围占第 i 位：H/S/V 三个通道分别查表后按位与，
+    结果中该位为1即表示像素落在这个范围内，与 cv2.inRange 的判定相同。
+
+    Args:
+        ranges: [(lower, upper), ...]，最多8个不同的范围
+
+    Returns:
+        (cv2.LUT 用的查找表 (1, 256, 3) uint8, {范围键: 位掩码})
+    """
+    lut = np.zeros((1, 256, 3), dtype=np.uint8)
+    bits: Dict[bytes, int] = {}
+    values = np.arange(256)
+    for lower, upper in ranges:
+        key = _range_key(lower, upper)
+        if key in bits:
+            continue
+        if len(bits) >= 8:
+            raise ValueError("颜色范围超过8个，无法打包到uint8中")
+        bit = 1 << len(bits)
+        bits[key] = bit
+        for c in range(3):
+            inside = (values >= lower[c]) & (values <= upper[c])
+            lut[0, inside, c] |= bit
+    return lut, bits
+
+
+def _download(image) -> np.ndarray:
+    """UMat 结果取回为 ndarray（findContours 等只能在CPU上处理）"""
+    return image.get() if isinstance(image, cv2.UMat) else image
+
+
+def _read_image(path: str, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """
+    读取图片（支持中文路径）
+
+    Args:
+        path: 图片路径
+        flags: cv2.imdecode 的读取方式，默认读取为BGR
+
+    Returns:
+        图像，读取失败时为None
+    """
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    if data.size == 0:
+        return None
+    return cv2.imdecode(data, flags)
+
+
 def save_template(frame: np.ndarray, name: str, x: int, y: int, size: int = 32):
     """
     保存模板图片
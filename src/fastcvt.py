@@ -0,0 +1,653 @@
+"""
+图像快速转换模块
+逐帧调用的像素处理内核，优先使用 Numba JIT 编译，未安装 Numba 时回退到 NumPy 实现
+"""
+import heapq
+import threading
+
+import numpy as np
+
+try:
+    from numba import get_num_threads, njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True, boundscheck=False)
+    def bgra_to_bgr(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        BGRA -> BGR（去掉alpha通道），结果写入预分配的 dst
+
+        Args:
+            src: BGRA图像 (H, W, 4) uint8
+            dst: 输出缓冲区 (H, W, 3) uint8，需为连续内存
+
+        Returns:
+            dst
+        """
+        h, w = src.shape[0], src.shape[1]
+        for i in range(h):
+            for j in range(w):
+                dst[i, j, 0] = src[i, j, 0]
+                dst[i, j, 1] = src[i, j, 1]
+                dst[i, j, 2] = src[i, j, 2]
+        return dst
+
+    @njit(cache=True, parallel=True, fastmath=True)
+    def frame_similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        计算两帧的灰度相似度（单次遍历，无中间数组）
+
+        Args:
+            a: BGR图像 (H, W, 3) uint8
+            b: BGR图像 (H, W, 3) uint8
+
+        Returns:
+            相似度 0~1，1表示完全相同
+        """
+        h, w = a.shape[0], a.shape[1]
+        acc = 0
+        for i in prange(h):
+            for j in range(w):
+                ga = (np.int32(a[i, j, 0]) + np.int32(a[i, j, 1]) + np.int32(a[i, j, 2])) // 3
+                gb = (np.int32(b[i, j, 0]) + np.int32(b[i, j, 1]) + np.int32(b[i, j, 2])) // 3
+                acc += abs(ga - gb)
+        return 1.0 - acc / (h * w * 255.0)
+
+    @njit(cache=True, parallel=True, fastmath=True)
+    def bgra_similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        直接在原始BGRA帧上计算灰度相似度
+
+        灰度（整数亮度公式）、差值和累加在同一次遍历中完成，每个字节只读一次
+
+        Args:
+            a: BGRA图像 (H, W, 4) uint8
+            b: BGRA图像 (H, W, 4) uint8
+
+        Returns:
+            相似度 0~1，1表示完全相同
+        """
+        h, w = a.shape[0], a.shape[1]
+        acc = 0
+        for i in prange(h):
+            for j in range(w):
+                ga = (np.int32(a[i, j, 2]) * 77 + np.int32(a[i, j, 1]) * 150 +
+                      np.int32(a[i, j, 0]) * 29) >> 8
+                gb = (np.int32(b[i, j, 2]) * 77 + np.int32(b[i, j, 1]) * 150 +
+                      np.int32(b[i, j, 0]) * 29) >> 8
+                acc += abs(ga - gb)
+        return 1.0 - acc / (h * w * 255.0)
+
+    @njit(cache=True, parallel=True, fastmath=True)
+    def bgr_to_gray(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        BGR -> 灰度（整数亮度公式 (R*77 + G*150 + B*29) >> 8），结果写入 dst
+
+        Args:
+            src: BGR图像 (H, W, 3) uint8
+            dst: 输出缓冲区 (H, W) uint8
+
+        Returns:
+            dst
+        """
+        h, w = src.shape[0], src.shape[1]
+        for i in prange(h):
+            for j in range(w):
+                dst[i, j] = (np.uint16(src[i, j, 2]) * 77 +
+                             np.uint16(src[i, j, 1]) * 150 +
+                             np.uint16(src[i, j, 0]) * 29) >> 8
+        return dst
+
+    @njit(cache=True, parallel=True, fastmath=True)
+    def hsv_range_bits(hsv: np.ndarray, lowers: np.ndarray, spans: np.ndarray,
+                       dst: np.ndarray) -> np.ndarray:
+        """
+        一次遍历判断每个像素落在哪些HSV范围内，结果按位打包写入 dst
+
+        利用uint8减法回绕，lower <= v <= upper 等价于 (v - lower) <= (upper - lower)，
+        每个通道只需一次减法和一次比较，没有分支。
+
+        Args:
+            hsv: HSV图像 (H, W, 3) uint8
+            lowers: 各范围下限 (N, 3) uint8，N <= 8
+            spans: 各范围宽度 upper - lower (N, 3) uint8
+            dst: 输出缓冲区 (H, W) uint8，第 i 位表示是否落在第 i 个范围内
+
+        Returns:
+            dst
+        """
+        h, w = hsv.shape[0], hsv.shape[1]
+        n = lowers.shape[0]
+        for i in prange(h):
+            for j in range(w):
+                bits = np.uint8(0)
+                for r in range(n):
+                    inside = ((np.uint8(hsv[i, j, 0] - lowers[r, 0]) <= spans[r, 0]) &
+                              (np.uint8(hsv[i, j, 1] - lowers[r, 1]) <= spans[r, 1]) &
+                              (np.uint8(hsv[i, j, 2] - lowers[r, 2]) <= spans[r, 2]))
+                    bits |= np.uint8(inside) << r
+                dst[i, j] = bits
+        return dst
+
+    @njit(cache=True)
+    def grid_candidates(scores: np.ndarray, threshold: float):
+        """
+        找出每个格子中得分超过阈值的模板，按 (行, 列, 模板序号) 顺序返回
+
+        Args:
+            scores: 各模板在每个格子上的得分 (N, rows, cols) float32
+            threshold: 得分阈值（不含）
+
+        Returns:
+            (模板序号, 行, 列) 三个等长的 int32 数组
+        """
+        n, rows, cols = scores.shape
+        count = 0
+        for r in range(rows):
+            for c in range(cols):
+                for t in range(n):
+                    if scores[t, r, c] > threshold:
+                        count += 1
+        tpl_idx = np.empty(count, dtype=np.int32)
+        row_idx = np.empty(count, dtype=np.int32)
+        col_idx = np.empty(count, dtype=np.int32)
+        k = 0
+        for r in range(rows):
+            for c in range(cols):
+                for t in range(n):
+                    if scores[t, r, c] > threshold:
+                        tpl_idx[k] = t
+                        row_idx[k] = r
+                        col_idx[k] = c
+                        k += 1
+        return tpl_idx, row_idx, col_idx
+
+    @njit(cache=True, boundscheck=False)
+    def grid_bfs(grid: np.ndarray, sx: int, sy: int, gx: int, gy: int,
+                 obstacles: bool, parent: np.ndarray) -> int:
+        """
+        在网格上从起点广度优先搜索，直到到达与目标相邻的格子
+
+        邻居按 上、下、左、右 的顺序展开，目标格子本身不检查是否可通过（可以是怪物、门等）。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            gx, gy: 目标坐标
+            obstacles: 是否把墙视为障碍
+            parent: 输出 (rows * cols,) int32，每个已访问格子的前驱下标（起点指向自身）
+
+        Returns:
+            走到目标前所在格子的下标，找不到路径时返回-1
+        """
+        h, w = grid.shape
+        parent[:] = -1
+        queue = np.empty(h * w, dtype=np.int32)
+        start = sy * w + sx
+        parent[start] = start
+        queue[0] = start
+        head, tail = 0, 1
+        while head < tail:
+            cur = queue[head]
+            head += 1
+            x = cur % w
+            y = cur // w
+            for k in range(4):
+                if k == 0:
+                    nx, ny = x, y - 1
+                elif k == 1:
+                    nx, ny = x, y + 1
+                elif k == 2:
+                    nx, ny = x - 1, y
+                else:
+                    nx, ny = x + 1, y
+                if nx == gx and ny == gy:
+                    return cur
+                if nx < 0 or nx >= w or ny < 0 or ny >= h:
+                    continue
+                n = ny * w + nx
+                if parent[n] != -1:
+                    continue
+                if obstacles and grid[ny, nx] == 1:
+                    continue
+                parent[n] = cur
+                queue[tail] = n
+                tail += 1
+        return -1
+
+    @njit(cache=True, boundscheck=False)
+    def grid_flood(grid: np.ndarray, sx: int, sy: int, obstacles: bool,
+                   parent: np.ndarray, dist: np.ndarray):
+        """
+        从起点对整个网格做广度优先泛洪，记录每个格子的步数和前驱
+
+        展开顺序与 grid_bfs 相同，两者得到的前驱关系一致。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            obstacles: 是否把墙视为障碍
+            parent: 输出 (rows * cols,) int32，前驱下标（起点指向自身，未到达为-1）
+            dist: 输出 (rows, cols) int32，步数（未到达为-1）
+        """
+        h, w = grid.shape
+        parent[:] = -1
+        dist[:, :] = -1
+        queue = np.empty(h * w, dtype=np.int32)
+        start = sy * w + sx
+        parent[start] = start
+        dist[sy, sx] = 0
+        queue[0] = start
+        head, tail = 0, 1
+        while head < tail:
+            cur = queue[head]
+            head += 1
+            x = cur % w
+            y = cur // w
+            d = dist[y, x] + 1
+            for k in range(4):
+                if k == 0:
+                    nx, ny = x, y - 1
+                elif k == 1:
+                    nx, ny = x, y + 1
+                elif k == 2:
+                    nx, ny = x - 1, y
+                else:
+                    nx, ny = x + 1, y
+                if nx < 0 or nx >= w or ny < 0 or ny >= h:
+                    continue
+                n = ny * w + nx
+                if parent[n] != -1:
+                    continue
+                if obstacles and grid[ny, nx] == 1:
+                    continue
+                parent[n] = cur
+                dist[ny, nx] = d
+                queue[tail] = n
+                tail += 1
+
+    @njit(cache=True, boundscheck=False)
+    def grid_astar(grid: np.ndarray, sx: int, sy: int, gx: int, gy: int,
+                   parent: np.ndarray) -> bool:
+        """
+        在网格上用A*查找起点到终点的路径（默认成本：空地=1，其他=10）
+
+        堆中条目按 (f, x, y) 字典序编码为单个整数，出堆顺序与 heapq 弹出 (f, (x, y)) 相同；
+        过期条目出堆时直接跳过。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            gx, gy: 终点坐标
+            parent: 输出 (rows * cols,) int32，前驱下标
+
+        Returns:
+            是否找到路径
+        """
+        h, w = grid.shape
+        parent[:] = -1
+        g = np.full(h * w, -1, dtype=np.int64)
+        # 一致启发式下每个格子只展开一次，最多被四个邻居各改进一次
+        heap = np.empty(4 * h * w + 1, dtype=np.int64)
+        g[sy * w + sx] = 0
+        heap[0] = ((abs(sx - gx) + abs(sy - gy)) * w + sx) * h + sy
+        size = 1
+        while size > 0:
+            key = heap[0]
+            size -= 1
+            if size > 0:
+                last = heap[size]
+                i = 0
+                while True:
+                    c = 2 * i + 1
+                    if c >= size:
+                        break
+                    if c + 1 < size and heap[c + 1] < heap[c]:
+                        c += 1
+                    if heap[c] >= last:
+                        break
+                    heap[i] = heap[c]
+                    i = c
+                heap[i] = last
+
+            y = key % h
+            x = (key // h) % w
+            if x == gx and y == gy:
+                return True
+            cur = y * w + x
+            gc = g[cur]
+            if key // (h * w) != gc + abs(x - gx) + abs(y - gy):
+                continue  # 过期条目
+            for k in range(4):
+                if k == 0:
+                    nx, ny = x, y - 1
+                elif k == 1:
+                    nx, ny = x, y + 1
+                elif k == 2:
+                    nx, ny = x - 1, y
+                else:
+                    nx, ny = x + 1, y
+                if nx < 0 or nx >= w or ny < 0 or ny >= h:
+                    continue
+                cell = grid[ny, nx]
+                if cell == 1:
+                    continue
+                n = ny * w + nx
+                t = gc + (1 if cell == 0 else 10)
+                if g[n] == -1 or t < g[n]:
+                    parent[n] = cur
+                    g[n] = t
+                    item = ((t + abs(nx - gx) + abs(ny - gy)) * w + nx) * h + ny
+                    i = size
+                    size += 1
+                    while i > 0:
+                        p = (i - 1) // 2
+                        if heap[p] <= item:
+                            break
+                        heap[i] = heap[p]
+                        i = p
+                    heap[i] = item
+        return False
+else:
+    def bgra_to_bgr(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        BGRA -> BGR（去掉alpha通道），结果写入预分配的 dst
+
+        Args:
+            src: BGRA图像 (H, W, 4) uint8
+            dst: 输出缓冲区 (H, W, 3) uint8，需为连续内存
+
+        Returns:
+            dst
+        """
+        np.copyto(dst, src[:, :, :3])
+        return dst
+
+    def frame_similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        计算两帧的灰度相似度
+
+        Args:
+            a: BGR图像 (H, W, 3) uint8
+            b: BGR图像 (H, W, 3) uint8
+
+        Returns:
+            相似度 0~1，1表示完全相同
+        """
+        ga = a.sum(axis=2, dtype=np.int32) // 3
+        gb = b.sum(axis=2, dtype=np.int32) // 3
+        return 1.0 - np.abs(ga - gb).mean() / 255.0
+
+    def bgra_similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        直接在原始BGRA帧上计算灰度相似度
+
+        Args:
+            a: BGRA图像 (H, W, 4) uint8
+            b: BGRA图像 (H, W, 4) uint8
+
+        Returns:
+            相似度 0~1，1表示完全相同
+        """
+        ga = bgr_to_gray(a, np.empty(a.shape[:2], dtype=np.uint8)).astype(np.int16)
+        gb = bgr_to_gray(b, np.empty(b.shape[:2], dtype=np.uint8)).astype(np.int16)
+        return 1.0 - np.abs(ga - gb).mean() / 255.0
+
+    def bgr_to_gray(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        BGR -> 灰度（整数亮度公式 (R*77 + G*150 + B*29) >> 8），结果写入 dst
+
+        Args:
+            src: BGR图像 (H, W, 3) uint8
+            dst: 输出缓冲区 (H, W) uint8
+
+        Returns:
+            dst
+        """
+        b = src[:, :, 0].astype(np.uint16)
+        g = src[:, :, 1].astype(np.uint16)
+        r = src[:, :, 2].astype(np.uint16)
+        np.right_shift(r * 77 + g * 150 + b * 29, 8, out=dst, casting='unsafe')
+        return dst
+
+    def hsv_range_bits(hsv: np.ndarray, lowers: np.ndarray, spans: np.ndarray,
+                       dst: np.ndarray) -> np.ndarray:
+        """
+        判断每个像素落在哪些HSV范围内，结果按位打包写入 dst
+
+        Args:
+            hsv: HSV图像 (H, W, 3) uint8
+            lowers: 各范围下限 (N, 3) uint8，N <= 8
+            spans: 各范围宽度 upper - lower (N, 3) uint8
+            dst: 输出缓冲区 (H, W) uint8，第 i 位表示是否落在第 i 个范围内
+
+        Returns:
+            dst
+        """
+        dst.fill(0)
+        for r in range(lowers.shape[0]):
+            # uint8 减法回绕：lower <= v <= upper 等价于 (v - lower) <= span
+            inside = ((hsv - lowers[r]) <= spans[r]).all(axis=-1)
+            dst |= inside.astype(np.uint8) << r
+        return dst
+
+    def grid_candidates(scores: np.ndarray, threshold: float):
+        """
+        找出每个格子中得分超过阈值的模板，按 (行, 列, 模板序号) 顺序返回
+
+        Args:
+            scores: 各模板在每个格子上的得分 (N, rows, cols) float32
+            threshold: 得分阈值（不含）
+
+        Returns:
+            (模板序号, 行, 列) 三个等长的 int32 数组
+        """
+        # (rows, cols, N) 上的 nonzero 天然按 行、列、模板序号 排序
+        row_idx, col_idx, tpl_idx = np.nonzero(scores.transpose(1, 2, 0) > threshold)
+        return tpl_idx.astype(np.int32), row_idx.astype(np.int32), col_idx.astype(np.int32)
+
+    def grid_bfs(grid: np.ndarray, sx: int, sy: int, gx: int, gy: int,
+                 obstacles: bool, parent: np.ndarray) -> int:
+        """
+        在网格上从起点广度优先搜索，直到到达与目标相邻的格子
+
+        邻居按 上、下、左、右 的顺序展开，目标格子本身不检查是否可通过（可以是怪物、门等）。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            gx, gy: 目标坐标
+            obstacles: 是否把墙视为障碍
+            parent: 输出 (rows * cols,) int32，每个已访问格子的前驱下标（起点指向自身）
+
+        Returns:
+            走到目标前所在格子的下标，找不到路径时返回-1
+        """
+        h, w = grid.shape
+        # 逐格访问时Python列表比ndarray标量索引快得多
+        walls = (grid == 1).ravel().tolist() if obstacles else None
+        prev = [-1] * (h * w)
+        start = sy * w + sx
+        prev[start] = start
+        queue = [start]
+        found = -1
+        for cur in queue:  # 遍历时追加元素，即FIFO队列
+            x, y = cur % w, cur // w
+            for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+                if nx == gx and ny == gy:
+                    found = cur
+                    break
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                n = ny * w + nx
+                if prev[n] != -1 or (walls is not None and walls[n]):
+                    continue
+                prev[n] = cur
+                queue.append(n)
+            if found != -1:
+                break
+        parent[:] = prev
+        return found
+
+    def grid_flood(grid: np.ndarray, sx: int, sy: int, obstacles: bool,
+                   parent: np.ndarray, dist: np.ndarray):
+        """
+        从起点对整个网格做广度优先泛洪，记录每个格子的步数和前驱
+
+        展开顺序与 grid_bfs 相同，两者得到的前驱关系一致。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            obstacles: 是否把墙视为障碍
+            parent: 输出 (rows * cols,) int32，前驱下标（起点指向自身，未到达为-1）
+            dist: 输出 (rows, cols) int32，步数（未到达为-1）
+        """
+        h, w = grid.shape
+        walls = (grid == 1).ravel().tolist() if obstacles else None
+        prev = [-1] * (h * w)
+        steps = [-1] * (h * w)
+        start = sy * w + sx
+        prev[start] = start
+        steps[start] = 0
+        queue = [start]
+        for cur in queue:  # 遍历时追加元素，即FIFO队列
+            x, y = cur % w, cur // w
+            d = steps[cur] + 1
+            for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                n = ny * w + nx
+                if prev[n] != -1 or (walls is not None and walls[n]):
+                    continue
+                prev[n] = cur
+                steps[n] = d
+                queue.append(n)
+        parent[:] = prev
+        dist.ravel()[:] = steps
+
+    def grid_astar(grid: np.ndarray, sx: int, sy: int, gx: int, gy: int,
+                   parent: np.ndarray) -> bool:
+        """
+        在网格上用A*查找起点到终点的路径（默认成本：空地=1，其他=10）
+
+        堆中条目按 (f, x, y) 字典序编码为单个整数，出堆顺序与 heapq 弹出 (f, (x, y)) 相同；
+        过期条目出堆时直接跳过。
+
+        Args:
+            grid: 网格地图 (rows, cols)，1表示墙
+            sx, sy: 起点坐标（需在网格内）
+            gx, gy: 终点坐标
+            parent: 输出 (rows * cols,) int32，前驱下标
+
+        Returns:
+            是否找到路径
+        """
+        h, w = grid.shape
+        cells = grid.ravel().tolist()
+        prev = [-1] * (h * w)
+        g = [-1] * (h * w)
+        g[sy * w + sx] = 0
+        heap = [((abs(sx - gx) + abs(sy - gy)) * w + sx) * h + sy]
+        found = False
+        while heap:
+            key = heapq.heappop(heap)
+            y = key % h
+            x = (key // h) % w
+            if x == gx and y == gy:
+                found = True
+                break
+            gc = g[y * w + x]
+            if key // (h * w) != gc + abs(x - gx) + abs(y - gy):
+                continue  # 过期条目
+            for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                n = ny * w + nx
+                cell = cells[n]
+                if cell == 1:
+                    continue
+                t = gc + (1 if cell == 0 else 10)
+                if g[n] == -1 or t < g[n]:
+                    prev[n] = y * w + x
+                    g[n] = t
+                    heapq.heappush(heap, ((t + abs(nx - gx) + abs(ny - gy)) * w + nx) * h + ny)
+        parent[:] = prev
+        return found
+
+
+def make_bgra_to_bgr(height: int, width: int):
+    """
+    生成针对固定尺寸特化的 BGRA -> BGR 内核
+
+    尺寸作为编译期常量写入内核，循环次数已知，便于LLVM展开和向量化。
+    调用方需保证输入尺寸与特化尺寸一致（内核不做边界检查）。
+    未安装Numba时直接返回通用实现。
+
+    Args:
+        height: 图像高度
+        width: 图像宽度
+
+    Returns:
+        kernel(src, dst) -> dst
+    """
+    if not HAS_NUMBA:
+        return bgra_to_bgr
+
+    h, w = int(height), int(width)
+
+    @njit(fastmath=True, boundscheck=False)
+    def kernel(src, dst):
+        for i in range(h):
+            for j in range(w):
+                dst[i, j, 0] = src[i, j, 0]
+                dst[i, j, 1] = src[i, j, 1]
+                dst[i, j, 2] = src[i, j, 2]
+        return dst
+
+    # 立即编译，避免第一帧卡顿
+    kernel(np.zeros((h, w, 4), dtype=np.uint8), np.empty((h, w, 3), dtype=np.uint8))
+    return kernel
+
+
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+
+def warmup_async():
+    """在后台线程中预热JIT内核（只启动一次），不阻塞调用方"""
+    global _warmup_thread
+    if not HAS_NUMBA:
+        return
+    with _warmup_lock:
+        if _warmup_thread is None:
+            # 线程池必须在调用线程中启动：TBB 在后台线程中初始化时，进程退出会卡住
+            get_num_threads()
+            _warmup_thread = threading.Thread(target=warmup, name="fastcvt-warmup", daemon=True)
+            _warmup_thread.start()
+
+
+def warmup():
+    """
+    用极小的输入预先触发JIT编译，避免第一帧卡顿
+
+    内核都带 cache=True，编译结果缓存在磁盘上，之后的启动只需加载缓存
+    """
+    if not HAS_NUMBA:
+        return
+    src = np.zeros((2, 2, 4), dtype=np.uint8)
+    dst = np.empty((2, 2, 3), dtype=np.uint8)
+    bgra_to_bgr(src, dst)
+    frame_similarity(dst, dst)
+    bgra_similarity(src, src)
+    bgr_to_gray(dst, np.empty((2, 2), dtype=np.uint8))
+    ranges = np.zeros((1, 3), dtype=np.uint8)
+    hsv_range_bits(dst, ranges, ranges, np.empty((2, 2), dtype=np.uint8))
+    grid_candidates(np.zeros((1, 2, 2), dtype=np.float32), 0.5)
+    grid_bfs(np.zeros((2, 2), dtype=np.int64), 0, 0, 1, 1, True, np.empty(4, dtype=np.int32))
+    grid_flood(np.zeros((2, 2), dtype=np.int64), 0, 0, True,
+               np.empty(4, dtype=np.int32), np.empty((2, 2), dtype=np.int32))
+    grid_astar(np.zeros((2, 2), dtype=np.int64), 0, 0, 1, 1, np.empty(4, dtype=np.int32))
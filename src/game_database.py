@@ -3,13 +3,28 @@
 保存和加载游戏的静态数据（地图、怪物、物品位置等）
 支持探索后保存，下次直接使用
 """
+import bisect
+import copy
 import json
 import os
-from typing import Dict, List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import numpy as np
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
 from detector import Monster, Door, Key, Point
 
 
@@ -20,39 +35,45 @@ class FloorData:
     width: int = 13
     height: int = 11
     # 网格地图: 0=空地, 1=墙, 2=门, 3=怪物, 4=钥匙, 5=楼梯, 6=商店, 7=物品(血瓶/攻击/防御)
-    grid: List[List[int]] = None
-    monsters: List[Dict] = None
-    doors: List[Dict] = None
-    keys: List[Dict] = None
+    # 以 (height, width) 的 int8 ndarray 连续存储，序列化时才转为列表
+    grid: np.ndarray = None
+    # 怪物/门/钥匙/物品按位置 (x, y) 索引，便于按坐标直接查找和删除
+    monsters: Dict[Tuple[int, int], Dict] = None
+    doors: Dict[Tuple[int, int], Dict] = None
+    keys: Dict[Tuple[int, int], Dict] = None
     stairs: Dict[str, Dict] = None
-    items: List[Dict] = None  # 地上的物品：血瓶、攻击、防御等
+    items: Dict[Tuple[int, int], Dict] = None  # 地上的物品：血瓶、攻击、防御等
 
     def __post_init__(self):
         if self.grid is None:
-            self.grid = [[0] * self.width for _ in range(self.height)]
+            self.grid = np.zeros((self.height, self.width), dtype=np.int8)
         if self.monsters is None:
-            self.monsters = []
+            self.monsters = {}
         if self.doors is None:
-            self.doors = []
+            self.doors = {}
         if self.keys is None:
-            self.keys = []
+            self.keys = {}
         if self.stairs is None:
             self.stairs = {}
         if self.items is None:
-            self.items = []
+            self.items = {}
+
+    def grid_as_list(self) -> List[List[int]]:
+        """以嵌套列表形式返回网格地图（兼容按列表使用的调用方）"""
+        return self.grid.tolist()
 
     def to_dict(self) -> dict:
-        """转换为字典"""
+        """转换为字典（怪物/门/钥匙/物品保存为列表，与旧的JSON格式一致）"""
         return {
             'floor_number': self.floor_number,
             'width': self.width,
             'height': self.height,
             'grid': self.grid,
-            'monsters': self.monsters,
-            'doors': self.doors,
-            'keys': self.keys,
-            'stairs': self.stairs,
-            'items': self.items
+            'monsters': list(self.monsters.values()),
+            'doors': list(self.doors.values()),
+            'keys': list(self.keys.values()),
+            'stairs': dict(self.stairs),
+            'items': list(self.items.values())
         }
 
     @classmethod
@@ -62,12 +83,12 @@ class FloorData:
             floor_number=data['floor_number'],
             width=data['width'],
             height=data['height'],
-            grid=data['grid'],
-            monsters=data['monsters'],
-            doors=data['doors'],
-            keys=data['keys'],
+            grid=np.asarray(data['grid'], dtype=np.int8),
+            monsters={(m['x'], m['y']): m for m in data['monsters']},
+            doors={(d['x'], d['y']): d for d in data['doors']},
+            keys={(k['x'], k['y']): k for k in data['keys']},
             stairs=data['stairs'],
-            items=data.get('items', [])
+            items={(i['x'], i['y']): i for i in data.get('items', [])}
         )
 
 
@@ -79,7 +100,7 @@ class GameDatabase:
         初始化数据库
 
         Args:
-            db_path: 数据库文件路径
+            db_path: 数据库文件路径（以 .msgpack 结尾时使用二进制的 msgpack 格式，需要安装 msgpack）
         """
         self.db_path = db_path
         self.floors: Dict[int, FloorData] = {}
@@ -90,6 +111,8 @@ class GameDatabase:
             'total_floors': 0,
             'explored_floors': []
         }
+        # 最近一次更新的时间戳（time.time()），只在保存/导出时格式化到 metadata
+        self._updated_at: Optional[float] = None
 
     def is_empty(self) -> bool:
         """检查数据库是否为空"""
@@ -127,21 +150,21 @@ class GameDatabase:
                 width=width,
                 height=height
             )
+            # explored_floors 保持有序，显示时无需再排序
             if floor_num not in self.metadata['explored_floors']:
-                self.metadata['explored_floors'].append(floor_num)
+                bisect.insort(self.metadata['explored_floors'], floor_num)
 
         floor = self.floors[floor_num]
 
-        # 转换网格数据
+        # 保存网格数据副本（序列化时再转换）
         if grid is not None:
-            floor.grid = grid.tolist()
+            floor.grid = np.array(grid, dtype=np.int8)
 
-        # 更新怪物数据（合并，不重复）
-        existing_monsters = {(m['x'], m['y']) for m in floor.monsters}
+        # 更新怪物数据（合并，已有位置保持不变）
         for monster in monsters:
-            key = (monster.x, monster.y)
-            if key not in existing_monsters:
-                floor.monsters.append({
+            pos = (monster.x, monster.y)
+            if pos not in floor.monsters:
+                floor.monsters[pos] = {
                     'x': monster.x,
                     'y': monster.y,
                     'name': monster.name,
@@ -150,32 +173,27 @@ class GameDatabase:
                     'hp': monster.hp,
                     'gold': monster.gold,
                     'exp': monster.exp
-                })
-                existing_monsters.add(key)
+                }
 
         # 更新门数据
-        existing_doors = {(d['x'], d['y']) for d in floor.doors}
         for door in doors:
-            key = (door.x, door.y)
-            if key not in existing_doors:
-                floor.doors.append({
+            pos = (door.x, door.y)
+            if pos not in floor.doors:
+                floor.doors[pos] = {
                     'x': door.x,
                     'y': door.y,
                     'color': door.color
-                })
-                existing_doors.add(key)
+                }
 
         # 更新钥匙数据
-        existing_keys = {(k['x'], k['y']) for k in floor.keys}
         for key in keys:
-            key_pos = (key.x, key.y)
-            if key_pos not in existing_keys:
-                floor.keys.append({
+            pos = (key.x, key.y)
+            if pos not in floor.keys:
+                floor.keys[pos] = {
                     'x': key.x,
                     'y': key.y,
                     'color': key.color
-                })
-                existing_keys.add(key_pos)
+                }
 
         # 更新楼梯数据
         if stairs.get('up'):
@@ -183,56 +201,53 @@ class GameDatabase:
         if stairs.get('down'):
             floor.stairs['down'] = {'x': stairs['down'].x, 'y': stairs['down'].y}
 
-        # 更新元数据
-        self.metadata['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 更新元数据（时间只记录时间戳，避免每次调用都格式化字符串）
+        self._updated_at = time.time()
         self.metadata['total_floors'] = len(self.floors)
         if self.metadata['created'] is None:
-            self.metadata['created'] = self.metadata['last_updated']
+            self.metadata['created'] = _format_time(self._updated_at)
+
+    def _sync_last_updated(self):
+        """把最近一次更新时间格式化写入 metadata"""
+        if self._updated_at is not None:
+            self.metadata['last_updated'] = _format_time(self._updated_at)
 
     def mark_item_collected(self, floor_num: int, x: int, y: int):
         """标记某位置的物品已被收集"""
         if floor_num in self.floors:
             floor = self.floors[floor_num]
-            # 从物品列表中移除
-            floor.items = [item for item in floor.items if not (item['x'] == x and item['y'] == y)]
+            # 从物品表中移除
+            floor.items.pop((x, y), None)
 
-            # 如果是钥匙，也从钥匙列表中移除
-            floor.keys = [key for key in floor.keys if not (key['x'] == x and key['y'] == y)]
+            # 如果是钥匙，也从钥匙表中移除
+            floor.keys.pop((x, y), None)
 
     def mark_monster_defeated(self, floor_num: int, x: int, y: int):
         """标记某位置的怪物已被击败"""
         if floor_num in self.floors:
-            floor = self.floors[floor_num]
-            floor.monsters = [m for m in floor.monsters if not (m['x'] == x and m['y'] == y)]
+            self.floors[floor_num].monsters.pop((x, y), None)
 
     def mark_door_opened(self, floor_num: int, x: int, y: int):
         """标记某位置的门已被打开"""
         if floor_num in self.floors:
-            floor = self.floors[floor_num]
-            floor.doors = [d for d in floor.doors if not (d['x'] == x and d['y'] == y)]
+            self.floors[floor_num].doors.pop((x, y), None)
 
     def get_monster_at(self, floor_num: int, x: int, y: int) -> Optional[Dict]:
         """获取指定位置的怪物信息"""
         if floor_num in self.floors:
-            for monster in self.floors[floor_num].monsters:
-                if monster['x'] == x and monster['y'] == y:
-                    return monster
+            return self.floors[floor_num].monsters.get((x, y))
         return None
 
     def get_door_at(self, floor_num: int, x: int, y: int) -> Optional[Dict]:
         """获取指定位置的门信息"""
         if floor_num in self.floors:
-            for door in self.floors[floor_num].doors:
-                if door['x'] == x and door['y'] == y:
-                    return door
+            return self.floors[floor_num].doors.get((x, y))
         return None
 
     def get_key_at(self, floor_num: int, x: int, y: int) -> Optional[Dict]:
         """获取指定位置的钥匙信息"""
         if floor_num in self.floors:
-            for key in self.floors[floor_num].keys:
-                if key['x'] == x and key['y'] == y:
-                    return key
+            return self.floors[floor_num].keys.get((x, y))
         return None
 
     def get_cell_type(self, floor_num: int, x: int, y: int) -> int:
@@ -240,23 +255,58 @@ class GameDatabase:
         if floor_num in self.floors:
             floor = self.floors[floor_num]
             if 0 <= y < floor.height and 0 <= x < floor.width:
-                return floor.grid[y][x]
+                return int(floor.grid[y, x])
         return -1  # 未知
 
+    def _is_msgpack(self) -> bool:
+        """数据库文件是否使用 msgpack 格式"""
+        if not self.db_path.endswith('.msgpack'):
+            return False
+        if not HAS_MSGPACK:
+            raise ImportError("使用 .msgpack 数据库文件需要安装 msgpack")
+        return True
+
     def save(self):
         """保存数据库到文件"""
-        os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
+        self.write(self.snapshot())
+
+    def snapshot(self) -> dict:
+        """
+        生成待保存数据的快照
+
+        快照与数据库之后的修改互不影响，可以交给其他线程调用 write() 写入文件。
 
-        data = {
-            'metadata': self.metadata,
+        Returns:
+            dict: {'metadata': ..., 'floors': {...}}
+        """
+        self._sync_last_updated()
+        return {
+            'metadata': copy.deepcopy(self.metadata),
             'floors': {
                 str(floor_num): floor_data.to_dict()
                 for floor_num, floor_data in self.floors.items()
             }
         }
 
-        with open(self.db_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def write(self, data: dict):
+        """
+        把 snapshot() 生成的快照写入数据库文件
+
+        Args:
+            data: 数据快照
+        """
+        os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
+
+        if self._is_msgpack():
+            # 网格以原始字节写入，不经过Python列表
+            with open(self.db_path, 'wb') as f:
+                f.write(msgpack.packb(data, default=_msgpack_default))
+        elif HAS_ORJSON:
+            with open(self.db_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(self.db_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False, default=_json_default)
 
     def load(self) -> bool:
         """
@@ -269,10 +319,20 @@ class GameDatabase:
             return False
 
         try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if self._is_msgpack():
+                with open(self.db_path, 'rb') as f:
+                    data = msgpack.unpackb(f.read(), object_hook=_msgpack_object_hook,
+                                           strict_map_key=False)
+            elif HAS_ORJSON:
+                with open(self.db_path, 'rb') as f:
+                    data = orjson.loads(f.read())
+            else:
+                with open(self.db_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
 
             self.metadata = data.get('metadata', {})
+            if 'explored_floors' in self.metadata:
+                self.metadata['explored_floors'].sort()
 
             for floor_num_str, floor_data in data.get('floors', {}).items():
                 floor_num = int(floor_num_str)
@@ -293,9 +353,11 @@ class GameDatabase:
             'total_floors': 0,
             'explored_floors': []
         }
+        self._updated_at = None
 
     def export_summary(self) -> str:
         """导出数据库摘要"""
+        self._sync_last_updated()
         lines = []
         lines.append("=" * 60)
         lines.append("Game Database Summary")
@@ -324,12 +386,39 @@ class GameDatabase:
         """获取怪物统计摘要"""
         summary = {}
         for floor in self.floors.values():
-            for monster in floor.monsters:
+            for monster in floor.monsters.values():
                 name = monster['name']
                 summary[name] = summary.get(name, 0) + 1
         return summary
 
 
+def _json_default(obj):
+    """标准库 json 无法直接序列化 ndarray 时的转换"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _format_time(timestamp: float) -> str:
+    """时间戳格式化为数据库中使用的时间字符串"""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _msgpack_default(obj):
+    """msgpack 序列化 ndarray：保存 dtype、形状和原始字节"""
+    if isinstance(obj, np.ndarray):
+        return {'__ndarray__': True, 'dtype': obj.dtype.str, 'shape': list(obj.shape),
+                'data': np.ascontiguousarray(obj).tobytes()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def _msgpack_object_hook(obj: dict):
+    """msgpack 反序列化时还原 ndarray"""
+    if obj.get('__ndarray__'):
+        return np.frombuffer(obj['data'], dtype=obj['dtype']).reshape(obj['shape']).copy()
+    return obj
+
+
 def main():
     """测试代码"""
     db = GameDatabase("test_db.json")
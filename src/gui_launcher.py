@@ -3,7 +3,9 @@
 提供实时控制、状态显示和决策可视化
 """
 import tkinter as tk
-from tkinter import ttk, scrolledtext
+from tkinter import ttk, scrolledtext, messagebox
+import json
+import os
 import threading
 import time
 from datetime import datetime
@@ -12,14 +14,20 @@ import cv2
 import numpy as np
 import queue
 import sys
+import hashlib
 import traceback
+from collections import deque
+from functools import lru_cache
 
 # 捕获导入错误，提供友好的错误信息
 try:
+    import win32gui
+    import win32con
+    from config import ensure_paths, MAP_REGION
     from capture import ScreenCapture
     from detector import GameElementDetector
     from state import GameState
-    from planner import GamePlanner
+    from planner import GamePlanner, Plan, Action
     from controller import SmartController
     from resource_manager import ResourceManager
     from game_database import GameDatabase
@@ -29,9 +37,23 @@ except ImportError as e:
     sys.exit(1)
 
 
+# Debug绘制用的颜色（BGR）
+DEBUG_GRID_COLOR = np.array((50, 50, 50), dtype=np.uint8)  # 网格线，直接用于切片赋值
+DEBUG_PLAYER_COLOR = (0, 255, 0)       # 玩家轮廓
+DEBUG_DETECTION_COLOR = (0, 165, 255)  # 怪物、门、钥匙、楼梯的格子框
+DEBUG_OVERLAY_COLOR = '#00ff00'        # 画布上的玩家检测框、中心点和标签
+
+
 class MotaGUI:
     """魔塔自动游玩GUI"""
 
+    CAPTURE_INTERVAL = 0.05  # 识别线程忙时，截图线程刷新队列中帧的间隔（秒）
+    FRAME_SIG_STRIDE = 8     # 计算帧指纹时的像素采样步长
+    WINDOW_CHECK_INTERVAL = 5000  # 检查游戏窗口是否移动的间隔（毫秒）
+    WINDOW_INFO_TICKS = 10        # 每隔多少次状态刷新（100毫秒一次）重新查询窗口标题和位置
+    LOOP_PERIOD = 0.15       # bot循环的初始（也是最长）周期（秒）
+    MIN_LOOP_PERIOD = 0.05   # 循环耗时持续较短时，周期最多缩短到该值
+
     def __init__(self, root):
         self.root = root
         self.root.title("MOTA Auto-Play Bot")
@@ -42,9 +64,21 @@ class MotaGUI:
         self.paused = False
         self.bot_thread = None
         self.debug_mode = tk.BooleanVar(value=True)
+        self._debug_enabled = True  # debug_mode 的副本，供后台线程读取（不在后台线程调用Tk）
+        self.debug_mode.trace_add('write', self._on_debug_mode_changed)
         self.auto_save_var = tk.BooleanVar(value=True)
         self.save_info_labels = {}
-        self.last_auto_save_step = 0  # 上次自动保存时的步数
+        self._next_auto_save_step = 50  # 下一次按步数自动保存的步数
+        self._last_save_floor = None    # 上次自动保存时的楼层
+        self._save_info_stamps = None  # 存档文件的 (mtime, size)，未变化时不刷新存档信息
+
+        # 标签文字更新合并：各处只登记新文字，由一次 after_idle 回调统一写入有变化的标签
+        self._pending_labels = {}
+        self._label_cache = {}
+        self._flush_scheduled = False
+        self._detail_text = None  # 决策详情框当前显示的文字
+        self._last_elapsed = None  # 运行时间显示的上一个秒数
+        self._log_scroll_scheduled = False
 
         # 游戏模块
         self.capture = None
@@ -56,11 +90,41 @@ class MotaGUI:
         self.game_db = GameDatabase("data/game_database.json")  # 游戏基础数据库
         self.manual_capture_region = None  # 手动指定的截图区域
 
-        # 线程安全的数据共享
-        self.current_frame = None
-        self.current_decision = None
-        self.current_action = None
-        self.frame_lock = threading.Lock()
+        # 线程间数据共享
+        # 截图线程 -> 识别线程：容量为1的帧队列，put阻塞提供背压，识别慢时旧帧被新帧替换
+        # 截图线程 -> UI：容量为1的预览队列，只保留最新一帧（已在截图线程中缩放、转换好的缓冲区）
+        # 预览缓冲区在空闲队列和预览队列之间轮转，UI线程paste完成后归还
+        self.capture_thread = None
+        self._frame_q = queue.Queue(maxsize=1)
+        self._preview_q = queue.Queue(maxsize=1)
+        self._preview_free = queue.Queue()
+        for _ in range(3):
+            self._preview_free.put(_PreviewBuffer())
+        self._preview_shown = False  # 预览是否已显示过画面（仅UI线程访问）
+        self._preview_visible = True  # 主窗口是否可见（最小化时为False，截图线程读取）
+        self._debug_buf = None  # Debug绘制用的画面缓冲区，跨帧复用（仅截图线程访问）
+        self._last_action_time = 0.0  # 上次执行动作的时间，早于它的帧视为过期
+        self._window_moved = False    # 主线程定时检查窗口是否移动，bot线程读取
+        self._wininfo_counter = 0     # 窗口信息刷新计数（仅UI线程访问）
+        self._wininfo_handle = None   # 上次查询窗口信息时的窗口句柄
+
+        # bot线程 -> UI：发布的数据都是元组，整体替换、读取一次，无需加锁
+        # 玩家状态快照，以及UI上一次显示的快照
+        self._state_snap = None
+        self._shown_state_snap = None
+        # 最新决策 (plan, action)，以及UI上一次显示的决策
+        self._latest = (None, None)
+        self._shown_latest = None
+
+        # 识别与数据库更新的缓存
+        self._last_frame_sig = None   # 上一次识别的帧指纹
+        self._last_detections = None  # 上一次的识别结果，画面未变化时直接复用
+        self._last_db_key = None      # 上一次写入数据库的检测结果键
+        self._db_status_cache = (None, "")  # (已探索楼层, 显示用字符串)
+
+        # 后台写文件线程：数据库和自动存档的序列化/写盘不占用bot线程
+        self._db_writer = _LatestWriter("db-writer")
+        self._state_writer = _LatestWriter("state-writer")
 
         # 创建界面
         self._create_widgets()
@@ -73,6 +137,10 @@ class MotaGUI:
             'capture_rect': None
         }
 
+        # 主窗口最小化/恢复时暂停/恢复预览
+        self.root.bind('<Unmap>', self._on_root_visibility, add='+')
+        self.root.bind('<Map>', self._on_root_visibility, add='+')
+
         # 启动UI更新循环
         self._start_ui_updates()
 
@@ -157,6 +225,39 @@ class MotaGUI:
         self.canvas = tk.Canvas(self.canvas_frame, width=416, height=416, bg='black')
         self.canvas.pack(pady=5)
 
+        # 预览图像只创建一次，之后每帧把预览缓冲区paste到同一个PhotoImage
+        self._preview_photo = ImageTk.PhotoImage('RGB', (416, 416))
+        self._preview_overlay_key = None  # 红框/文字的内容，变化时才更新
+
+        # 画布元素只创建一次，之后通过 coords/itemconfigure 更新，用 state 切换显示
+        self._canvas_img_id = self.canvas.create_image(
+            208, 208, image=self._preview_photo, state=tk.HIDDEN
+        )
+        self._canvas_rect_id = self.canvas.create_rectangle(
+            0, 0, 0, 0, outline='red', width=2, state=tk.HIDDEN
+        )
+        self._canvas_info_id = self.canvas.create_text(
+            208, 0, text="", fill='red', font=('Arial', 9, 'bold'), state=tk.HIDDEN
+        )
+        self._canvas_title_id = self.canvas.create_text(
+            208, 188, text="无游戏画面", fill='white', font=('Arial', 14, 'bold')
+        )
+        self._canvas_hint_id = self.canvas.create_text(
+            208, 218, text="", fill='yellow', font=('Arial', 10)
+        )
+
+        # Debug模式的检测框：画布矩形对象池，按需创建，用 coords 重定位，多余的隐藏
+        self._box_pool = []
+        self._box_label_id = self.canvas.create_text(
+            0, 0, text="", fill=DEBUG_OVERLAY_COLOR, anchor=tk.SW, font=('Arial', 9, 'bold'), state=tk.HIDDEN
+        )
+        self._no_player_id = self.canvas.create_text(
+            10, 30, text="No Player Detected!", fill='red', anchor=tk.W,
+            font=('Arial', 14, 'bold'), state=tk.HIDDEN
+        )
+        self._debug_overlay_key = None  # (是否显示, 预览尺寸)，与检测结果一起决定是否需要更新
+        self._debug_overlay_det = None
+
         # 窗口信息显示
         window_info_frame = ttk.LabelFrame(left_frame, text="窗口信息", padding=5)
         window_info_frame.pack(fill=tk.X, pady=5)
@@ -238,11 +339,50 @@ class MotaGUI:
         self.root.after(500, self._update_preview_from_thread)
         self.root.after(500, self._update_status_from_thread)
         self.root.after(1000, self.update_timer)
+        self.root.after(self.WINDOW_CHECK_INTERVAL, self._poll_window_moved)
+
+    def _set_label(self, label, text: str):
+        """登记标签的新文字，在下一次空闲时统一刷新（只能在Tk线程调用，工作线程请用 root.after 转交）"""
+        self._pending_labels[label] = text
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.root.after_idle(self._flush_labels)
+
+    def _flush_labels(self):
+        """把登记的标签文字写入界面，文字未变化的标签不调用config"""
+        self._flush_scheduled = False
+        pending, self._pending_labels = self._pending_labels, {}
+        for label, text in pending.items():
+            if self._label_cache.get(label) != text:
+                label.config(text=text)
+                self._label_cache[label] = text
 
     def log(self, message):
         """添加日志"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self._schedule_log_scroll()
+
+    def log_block(self, lines):
+        """
+        一次添加多行日志（共用一个时间戳，只做一次insert）
+
+        Args:
+            lines: 日志行列表
+        """
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        block = "".join(f"[{timestamp}] {line}\n" for line in lines)
+        self.log_text.insert(tk.END, block)
+        self._schedule_log_scroll()
+
+    def _schedule_log_scroll(self):
+        """日志滚动到底部，每100毫秒最多执行一次"""
+        if not self._log_scroll_scheduled:
+            self._log_scroll_scheduled = True
+            self.root.after(100, self._scroll_log)
+
+    def _scroll_log(self):
+        self._log_scroll_scheduled = False
         self.log_text.see(tk.END)
 
     def select_capture_region(self):
@@ -273,9 +413,6 @@ class MotaGUI:
     def _try_focus_game_window(self):
         """尝试激活游戏窗口（手动模式下使用）"""
         try:
-            import win32gui
-            import win32con
-
             # 尝试查找包含"魔塔"或"MOTA"的窗口
             def callback(hwnd, windows):
                 if win32gui.IsWindowVisible(hwnd):
@@ -313,14 +450,16 @@ class MotaGUI:
             self.log("机器人已在运行！")
             return
 
-        self.log("启动机器人...")
-        self.log("=" * 50)
-        self.log("重要提示: 请确保以下条件:")
-        self.log("  1. 游戏窗口已启动")
-        self.log("  2. 游戏窗口在前台且可见")
-        self.log("  3. 不要移动游戏窗口")
-        self.log("  4. 不要切换到其他窗口")
-        self.log("=" * 50)
+        self.log_block([
+            "启动机器人...",
+            "=" * 50,
+            "重要提示: 请确保以下条件:",
+            "  1. 游戏窗口已启动",
+            "  2. 游戏窗口在前台且可见",
+            "  3. 不要移动游戏窗口",
+            "  4. 不要切换到其他窗口",
+            "=" * 50,
+        ])
 
         self.running = True
         self.paused = False
@@ -333,14 +472,15 @@ class MotaGUI:
             self.log("Creating ScreenCapture...")
             if self.manual_capture_region:
                 self.capture = ScreenCapture(manual_region=self.manual_capture_region)
-                self.log(f"Using manual region: {self.manual_capture_region}")
-                self.log("Manual mode: Window detection skipped")
+                self.log_block([
+                    f"Using manual region: {self.manual_capture_region}",
+                    "Manual mode: Window detection skipped",
+                ])
             else:
                 self.capture = ScreenCapture()
                 # 只有在自动模式下才检查窗口句柄
                 if not self.capture.window_handle:
-                    self.log("ERROR: 未找到游戏窗口!")
-                    self.log("请先启动游戏，然后重新点击Start")
+                    self.log_block(["ERROR: 未找到游戏窗口!", "请先启动游戏，然后重新点击Start"])
                     self.running = False
                     self.status_var.set("No Game Window")
                     return
@@ -352,6 +492,9 @@ class MotaGUI:
 
             self.log("Creating GameState...")
             self.state = GameState(max_floors=24)
+            self._next_auto_save_step = 50
+            self._last_save_floor = self.state.player.floor
+            self._publish_state_snapshot()
             self.log("GameState initialized")
 
             self.log("Creating GamePlanner...")
@@ -380,15 +523,21 @@ class MotaGUI:
 
             self.status_var.set("Running")
 
-            # 启动bot线程
+            # 启动截图线程和bot（识别+决策）线程
             self.log("Starting bot thread...")
+            self._frame_q = queue.Queue(maxsize=1)
+            self._last_action_time = 0.0
+            self._last_frame_sig = None
+            self._last_detections = None
+            self._last_db_key = None
+            self.capture_thread = threading.Thread(target=self._capture_worker, daemon=True)
+            self.capture_thread.start()
             self.bot_thread = threading.Thread(target=self._run_bot, daemon=True)
             self.bot_thread.start()
             self.log("Bot thread started - Auto-play begins!")
 
         except Exception as e:
-            self.log(f"Failed to start: {e}")
-            self.log(traceback.format_exc())
+            self.log_block([f"Failed to start: {e}", traceback.format_exc()])
             self.running = False
             self.status_var.set("Error")
 
@@ -413,52 +562,79 @@ class MotaGUI:
         self.log("机器人已停止")
 
         # 等待线程结束
-        if self.bot_thread and self.bot_thread.is_alive():
-            self.bot_thread.join(timeout=2)
+        for thread in (self.capture_thread, self.bot_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=2)
 
         # 停止时自动保存
         if self.state and self.auto_save_var.get():
             self.log("停止时自动保存...")
             self.quick_save()
 
-        # 保存游戏数据库
+        # 保存游戏数据库（后台写入）
         if not self.game_db.is_empty():
             self.log("保存游戏数据库...")
-            self.game_db.save()
-            self.log(f"数据库已保存: {self.game_db.metadata['total_floors']} 层")
+            message = f"数据库已保存: {self.game_db.metadata['total_floors']} 层"
+            self._db_writer.submit(
+                self.game_db.write, self.game_db.snapshot(),
+                on_done=lambda: self.root.after(0, self.log, message)
+            )
+
+    def flush_saves(self):
+        """等待后台写文件线程完成所有待写入的任务（退出前调用）"""
+        self._db_writer.flush()
+        self._state_writer.flush()
 
-    def quick_save(self):
+    def quick_save(self, background: bool = False):
         """快速保存到存档槽1"""
         if not self.state:
             self.log("没有游戏状态可以保存！")
             return
-        self.save_game(1)
+        self.save_game(1, background=background)
 
-    def save_game(self, slot: int):
-        """保存游戏到指定存档槽"""
+    def save_game(self, slot: int, background: bool = False):
+        """
+        保存游戏到指定存档槽
+
+        Args:
+            slot: 存档槽
+            background: 为True时只在当前线程生成状态快照，写文件交给后台线程
+        """
         if not self.state:
             self.log("没有游戏状态可以保存！")
             return
 
-        import os
         SAVE_DIR = "data/saves"
         os.makedirs(SAVE_DIR, exist_ok=True)
         filepath = os.path.join(SAVE_DIR, f"save_{slot}.json")
 
+        if background:
+            self._state_writer.submit(
+                _write_save_slot, self.state.snapshot(), filepath,
+                on_done=lambda: self.root.after(0, self._on_saved, slot)
+            )
+            return
+
         try:
-            self.state.save_state(filepath)
-            self.log(f"游戏已保存到 槽位 {slot}")
-            self._update_save_info_display()
+            snapshot = self.state.snapshot()
+            # 先等后台线程写完已提交的（更旧的）自动存档，避免它在本次写入之后覆盖存档
+            self._state_writer.flush()
+            _write_save_slot(snapshot, filepath)
+            self._on_saved(slot)
         except Exception as e:
             self.log(f"保存失败: {e}")
 
+    def _on_saved(self, slot: int):
+        """存档写入完成后的提示和显示更新"""
+        self.log(f"游戏已保存到 槽位 {slot}")
+        self._update_save_info_display()
+
     def load_game(self, slot: int):
         """加载指定存档槽"""
         if self.running:
             self.log("请先停止机器人！")
             return
 
-        import os
         SAVE_DIR = "data/saves"
         filepath = os.path.join(SAVE_DIR, f"save_{slot}.json")
 
@@ -472,62 +648,61 @@ class MotaGUI:
                 self.state = GameState(max_floors=24)
 
             if self.state.load_state(filepath):
-                self.log(f"从 槽位 {slot} 加载游戏")
-                self.log(f"  楼层: {self.state.player.floor}")
-                self.log(f"  生命: {self.state.player.hp}/{self.state.player.max_hp}")
-                self.log(f"  钥匙: 黄{self.state.player.yellow_keys} 蓝{self.state.player.blue_keys} 红{self.state.player.red_keys}")
-                self.log(f"  金币: {self.state.player.gold}")
-                self.log(f"  步数: {self.state.steps}")
+                self._publish_state_snapshot()
+                player = self.state.player
+                self.log_block([
+                    f"从 槽位 {slot} 加载游戏",
+                    f"  楼层: {player.floor}",
+                    f"  生命: {player.hp}/{player.max_hp}",
+                    f"  钥匙: 黄{player.yellow_keys} 蓝{player.blue_keys} 红{player.red_keys}",
+                    f"  金币: {player.gold}",
+                    f"  步数: {self.state.steps}",
+                ])
                 self._update_save_info_display()
             else:
                 self.log(f"从 槽位 {slot} 加载失败")
         except Exception as e:
-            self.log(f"加载错误: {e}")
-            import traceback
-            self.log(traceback.format_exc())
+            self.log_block([f"加载错误: {e}", traceback.format_exc()])
 
     def _update_save_info_display(self):
-        """更新存档信息显示"""
-        import os
-        import json
+        """更新存档信息显示（存档文件均未变化时跳过）"""
         SAVE_DIR = "data/saves"
+        filepaths = [os.path.join(SAVE_DIR, f"save_{i}.json") for i in range(1, 4)]
 
-        for i in range(1, 4):
-            filepath = os.path.join(SAVE_DIR, f"save_{i}.json")
-            if os.path.exists(filepath):
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        state_dict = json.load(f)
+        stamps = tuple(_file_stamp(path) for path in filepaths)
+        if stamps == self._save_info_stamps:
+            return
+        self._save_info_stamps = stamps
 
-                    p = state_dict['player']
-                    time_str = state_dict.get('save_time', '')
+        for i, (filepath, stamp) in enumerate(zip(filepaths, stamps), start=1):
+            if stamp is not None:
+                try:
+                    header = _read_save_header(filepath, stamp)
+                    time_str = header.get('save_time', '')
                     if ' ' in time_str:
                         time_str = time_str.split()[1][:5]  # 只显示时分
 
-                    text = f"槽位 {i}: F{p['floor']} HP:{p['hp']}/{p['max_hp']} 攻:{p['atk']} 金:{p['gold']} {time_str}"
+                    text = f"槽位 {i}: F{header['floor']} HP:{header['hp']}/{header['max_hp']} 攻:{header['atk']} 金:{header['gold']} {time_str}"
                 except:
                     text = f"槽位 {i}: [损坏]"
             else:
                 text = f"槽位 {i}: [空]"
 
             if i in self.save_info_labels:
-                self.save_info_labels[i].config(text=text)
+                self._set_label(self.save_info_labels[i], text)
 
     def _check_auto_save(self, step_count: int):
         """检查是否需要自动保存（每50步或切换楼层时）"""
-        if not self.state or not self.auto_save_var.get():
-            return
-
+        # 常见情况：步数未到且楼层未变，一次比较即可返回
         current_floor = self.state.player.floor
-        last_floor = getattr(self, '_last_save_floor', current_floor)
+        if step_count < self._next_auto_save_step and current_floor == self._last_save_floor:
+            return
 
-        # 每50步或切换楼层时自动保存
-        should_save = (step_count - self.last_auto_save_step >= 50) or (current_floor != last_floor)
+        self._next_auto_save_step = step_count + 50
+        self._last_save_floor = current_floor
 
-        if should_save:
-            self.quick_save()
-            self.last_auto_save_step = step_count
-            self._last_save_floor = current_floor
+        if self.auto_save_var.get():
+            self.quick_save(background=True)
 
     def _load_database(self):
         """加载游戏数据库"""
@@ -542,22 +717,26 @@ class MotaGUI:
         if self.game_db.is_empty():
             text = "空"
         else:
-            text = f"层数: {self.game_db.metadata['total_floors']} | 已探索: {','.join(map(str, sorted(self.game_db.metadata['explored_floors'])))}"
-        self.db_status_label.config(text=text)
+            # 已探索楼层列表（数据库中保持有序）的字符串按内容缓存
+            floors = tuple(self.game_db.metadata['explored_floors'])
+            if floors != self._db_status_cache[0]:
+                self._db_status_cache = (floors, ','.join(map(str, floors)))
+            text = f"层数: {self.game_db.metadata['total_floors']} | 已探索: {self._db_status_cache[1]}"
+        self._set_label(self.db_status_label, text)
 
     def view_database(self):
         """查看数据库内容"""
         summary = self.game_db.export_summary()
-        self.log("=" * 50)
-        for line in summary.split('\n'):
-            self.log(line)
-        self.log("=" * 50)
+        self.log_block(["=" * 50, *summary.split('\n'), "=" * 50])
 
     def export_database(self):
         """导出数据库到文件"""
         try:
-            self.game_db.save()
-            self.log("游戏数据库导出成功")
+            # 数据库文件只由后台写入线程写，机器人运行中提交的快照与本次按顺序写入
+            self._db_writer.submit(
+                self.game_db.write, self.game_db.snapshot(),
+                on_done=lambda: self.root.after(0, self.log, "游戏数据库导出成功")
+            )
             self._update_db_status_display()
         except Exception as e:
             self.log(f"导出数据库失败: {e}")
@@ -568,8 +747,9 @@ class MotaGUI:
             self.log("请先停止机器人！")
             return
 
-        from tkinter import messagebox
         if messagebox.askyesno("确认重置", "确定要重置游戏数据库吗？所有探索数据将会丢失！"):
+            # 等停止时提交的旧快照写完，再写入重置后的数据库，避免旧数据覆盖
+            self._db_writer.flush()
             self.game_db.reset()
             self.game_db.save()
             self.log("游戏数据库已重置")
@@ -577,7 +757,7 @@ class MotaGUI:
 
     def _update_database_from_detection(self, floor_num: int, frame: np.ndarray,
                                         monsters, doors, keys, stairs):
-        """从检测结果更新游戏数据库"""
+        """从检测结果更新游戏数据库（检测结果与上一次相同时直接跳过）"""
         if not self.detector:
             return
 
@@ -587,49 +767,34 @@ class MotaGUI:
         width = w // grid_size
         height = h // grid_size
 
+        # 以元素坐标作为本次检测结果的键
+        monsters_key = tuple(sorted((m.x, m.y) for m in monsters))
+        doors_key = tuple(sorted((d.x, d.y) for d in doors))
+        keys_key = tuple(sorted((k.x, k.y) for k in keys))
+        stairs_key = tuple((s.x, s.y) if s else None for s in (stairs.get('up'), stairs.get('down')))
+        db_key = (floor_num, width, height, monsters_key, doors_key, keys_key, stairs_key)
+        if db_key == self._last_db_key:
+            return
+        self._last_db_key = db_key
+
         # 构建网格数据
-        grid = np.zeros((height, width), dtype=int)
-
-        # 标记怪物
-        for monster in monsters:
-            if 0 <= monster.y < height and 0 <= monster.x < width:
-                grid[monster.y, monster.x] = 3
-
-        # 标记门
-        for door in doors:
-            if 0 <= door.y < height and 0 <= door.x < width:
-                grid[door.y, door.x] = 2
-
-        # 标记钥匙
-        for key in keys:
-            if 0 <= key.y < height and 0 <= key.x < width:
-                grid[key.y, key.x] = 4
-
-        # 标记楼梯
-        if stairs.get('up'):
-            s = stairs['up']
-            if 0 <= s.y < height and 0 <= s.x < width:
-                grid[s.y, s.x] = 5
-        if stairs.get('down'):
-            s = stairs['down']
-            if 0 <= s.y < height and 0 <= s.x < width:
-                grid[s.y, s.x] = 5
+        grid = _build_grid(width, height, monsters_key, doors_key, keys_key, stairs_key)
 
         # 更新数据库
+        is_new_floor = not self.game_db.has_floor(floor_num)
         self.game_db.update_floor_from_detection(
             floor_num, width, height, monsters, doors, keys, stairs, grid
         )
 
-        # 自动保存数据库（每探索一个新楼层）
-        if not self.game_db.has_floor(floor_num):
-            self.game_db.save()
-            self._update_db_status_display()
+        # 自动保存数据库（每探索一个新楼层，后台写入）
+        if is_new_floor:
+            self._db_writer.submit(self.game_db.write, self.game_db.snapshot())
+            # 在机器人线程中调用，状态显示转交Tk线程刷新
+            self.root.after(0, self._update_db_status_display)
 
     def _update_window_info(self):
         """更新窗口信息显示"""
         try:
-            import win32gui
-
             if self.capture and self.capture.window_handle:
                 # 获取窗口信息
                 handle = self.capture.window_handle
@@ -638,39 +803,101 @@ class MotaGUI:
                 monitor = self.capture.monitor
 
                 # 更新显示
-                self.window_info_labels['title'].config(
-                    text=f"{title[:40]}... (HWND: {handle})" if len(title) > 40 else title
+                self._set_label(
+                    self.window_info_labels['title'],
+                    f"{title[:40]}... (HWND: {handle})" if len(title) > 40 else title
                 )
-                self.window_info_labels['pos'].config(
-                    text=f"({rect[0]}, {rect[1]})"
+                self._set_label(
+                    self.window_info_labels['pos'],
+                    f"({rect[0]}, {rect[1]})"
                 )
-                self.window_info_labels['size'].config(
-                    text=f"{rect[2] - rect[0]}x{rect[3] - rect[1]}"
+                self._set_label(
+                    self.window_info_labels['size'],
+                    f"{rect[2] - rect[0]}x{rect[3] - rect[1]}"
                 )
 
                 # 显示截图区域
                 if monitor:
-                    self.window_info_labels['capture'].config(
-                        text=f"x:{monitor['left']}, y:{monitor['top']}, {monitor['width']}x{monitor['height']}"
+                    self._set_label(
+                        self.window_info_labels['capture'],
+                        f"x:{monitor['left']}, y:{monitor['top']}, {monitor['width']}x{monitor['height']}"
                     )
 
                 self.log(f"Found window: {title}")
                 self.log(f"Capture region: {monitor['width']}x{monitor['height']} at ({monitor['left']}, {monitor['top']})")
             else:
-                self.window_info_labels['title'].config(text="Not detected")
+                self._set_label(self.window_info_labels['title'], "Not detected")
                 self.log("Game window not found! Please start the game first.")
 
         except Exception as e:
             self.log(f"Failed to get window info: {e}")
-            self.window_info_labels['title'].config(text="Error detecting window")
+            self._set_label(self.window_info_labels['title'], "Error detecting window")
+
+    def _capture_worker(self):
+        """截图线程：持续截图并送入帧队列和预览队列"""
+        while self.running:
+            if self.paused:
+                time.sleep(0.1)
+                continue
+
+            # 时间戳取截图开始的时刻：动作完成前开始的截图必须被判为旧帧
+            stamp = time.perf_counter()
+            try:
+                # capture() 会在下一次截图时复用缓冲区，送出去的帧需要独立的副本
+                frame = self.capture.capture().copy()
+            except Exception as e:
+                self.log(f"截图错误: {e}")
+                time.sleep(0.5)
+                continue
+
+            self._prepare_preview(frame)
+
+            # 识别线程空闲时立即取走；忙时最多等待一个截图间隔，然后用新帧替换旧帧
+            try:
+                self._frame_q.put((stamp, frame), timeout=self.CAPTURE_INTERVAL)
+            except queue.Full:
+                _put_latest(self._frame_q, (stamp, frame))
+
+    def _prepare_preview(self, frame: np.ndarray):
+        """在截图线程中把帧缩放写入空闲的预览缓冲区并转换为RGBA，再送入预览队列"""
+        if not self._preview_visible:
+            return  # 主窗口最小化，预览看不到，跳过缩放和Debug绘制
+
+        try:
+            buf = self._preview_free.get_nowait()
+        except queue.Empty:
+            return  # UI还没处理完之前的帧，跳过这一帧的预览
+
+        try:
+            # Debug模式：在原图上绘制检测框
+            if self._debug_enabled and self.detector:
+                frame = self._draw_detection_boxes(frame)
+
+            new_w, new_h, view = buf.layout(frame.shape[:2])
+            cv2.resize(frame, (new_w, new_h), dst=view, interpolation=cv2.INTER_AREA)
+            buf.to_rgba()
+        except Exception as e:
+            self._preview_free.put(buf)
+            if self._debug_enabled:
+                print(f"Preview update error: {e}")
+            return
+
+        stale = _put_latest(self._preview_q, buf)
+        if stale is not None:
+            self._preview_free.put(stale)
 
     def _run_bot(self):
-        """Bot主循环（在独立线程中运行）"""
+        """Bot主循环（在独立线程中运行，从帧队列取帧进行识别和决策）"""
         loop_count = 0
         last_action = None
         repeat_count = 0
         MAX_REPEAT = 3
         no_player_count = 0  # 检测不到玩家的次数
+        clock = _LoopClock(self.LOOP_PERIOD, self.MIN_LOOP_PERIOD)
+        # 循环中不会被替换的属性提前取为局部变量（self.state 可能被读档替换，每次重新读取）
+        frame_q = self._frame_q
+        detector = self.detector
+        sig_stride = self.FRAME_SIG_STRIDE
 
         self.log("Bot loop started...")
 
@@ -679,60 +906,76 @@ class MotaGUI:
                 time.sleep(0.1)
                 continue
 
+            loop_start = None
             try:
-                loop_count += 1
+                # 1. 取帧（队列为空时阻塞等待截图线程）
+                try:
+                    stamp, frame = frame_q.get(timeout=0.2)
+                except queue.Empty:
+                    continue
 
-                # 定期检查窗口是否被移动（每50步检查一次）
-                if loop_count % 50 == 0:
-                    if self.capture.check_window_moved():
-                        self.log("WARNING: 窗口已移动，继续运行可能导致问题")
-                        self.log("建议: 点击Stop停止，然后重新启动")
+                # 上一个动作执行前截取的帧已经过期
+                if stamp < self._last_action_time:
+                    continue
 
-                # 1. 截图
-                frame = self.capture.capture()
+                loop_start = time.perf_counter()
+                loop_count += 1
 
-                # 保存frame到共享变量（线程安全）
-                with self.frame_lock:
-                    self.current_frame = frame
+                # 窗口移动由主线程定时检查，这里只读取结果
+                if self._window_moved:
+                    self._window_moved = False
+                    self.log_block([
+                        "WARNING: 窗口已移动，继续运行可能导致问题",
+                        "建议: 点击Stop停止，然后重新启动",
+                    ])
 
                 # 2. 检测画面稳定性
                 if not self._is_stable():
-                    time.sleep(0.05)
                     continue
 
-                # 3. 识别游戏元素
-                player = self.detector.detect_player(frame)
+                # 3. 识别游戏元素（画面与上一次识别时相同则复用结果）
+                sig = _frame_signature(frame, sig_stride)
+                if sig == self._last_frame_sig:
+                    detections = self._last_detections
+                else:
+                    detections = detector.detect_all(frame)
+                    self._last_frame_sig = sig
+                    self._last_detections = detections
+                player = detections.player
                 if not player:
                     no_player_count += 1
                     if no_player_count <= 5:  # 只显示前5次
                         self.log(f"帧 {loop_count}: 无法检测到玩家！")
                     elif no_player_count == 6:
-                        self.log("玩家检测多次失败。请检查:")
-                        self.log("  1. 游戏是否正在运行且可见？")
-                        self.log("  2. 截图区域是否正确？")
-                        self.log("  3. 尝试先收集玩家模板")
-                    time.sleep(0.1)
+                        self.log_block([
+                            "玩家检测多次失败。请检查:",
+                            "  1. 游戏是否正在运行且可见？",
+                            "  2. 截图区域是否正确？",
+                            "  3. 尝试先收集玩家模板",
+                        ])
                     continue
 
                 # 重置计数器
                 no_player_count = 0
 
-                monsters = self.detector.detect_monsters(frame)
-                doors = self.detector.detect_doors(frame)
-                keys = self.detector.detect_keys(frame)
-                stairs = self.detector.detect_stairs(frame)
+                monsters = detections.monsters
+                doors = detections.doors
+                keys = detections.keys
+                stairs = detections.stairs
 
                 # 4. 更新游戏状态
-                self.state.update_player_position(player.x, player.y)
-                current_floor = self.state.get_current_floor()
+                state = self.state
+                state.update_player_position(player.x, player.y)
+                current_floor = state.get_current_floor()
                 current_floor.monsters = monsters
                 current_floor.doors = doors
                 current_floor.keys = keys
                 current_floor.stairs = stairs
+                self._publish_state_snapshot()
 
                 # 更新游戏数据库
                 self._update_database_from_detection(
-                    self.state.current_floor, frame, monsters, doors, keys, stairs
+                    state.current_floor, frame, monsters, doors, keys, stairs
                 )
 
                 # 自动保存检查
@@ -741,10 +984,8 @@ class MotaGUI:
                 # 5. 获取决策
                 action, plan = self._get_decision()
 
-                # 保存决策到共享变量（线程安全）
-                with self.frame_lock:
-                    self.current_decision = plan
-                    self.current_action = action
+                # 发布决策（单次属性赋值）
+                self._latest = (plan, action)
 
                 # 6. 检查重复
                 if action and action == last_action:
@@ -758,24 +999,23 @@ class MotaGUI:
                 # 7. 执行动作
                 if action:
                     self.controller.execute(action)
+                    self._last_action_time = time.perf_counter()
 
                 # 8. 记录日志（每10步）
                 if loop_count % 10 == 0:
                     self.log(f"步骤 {loop_count}: {plan.reason if plan else '思考中...'}")
 
-                # 9. 控制速度
-                time.sleep(0.15)
-
             except Exception as e:
-                self.log(f"循环错误: {e}")
-                import traceback
-                self.log(traceback.format_exc())
+                self.log_block([f"循环错误: {e}", traceback.format_exc()])
                 time.sleep(0.5)
 
+            finally:
+                # 9. 控制速度：按截止时间等待下一轮，本轮耗时已计入周期
+                if loop_start is not None:
+                    clock.wait(loop_start)
+
     def _get_decision(self):
         """获取下一步决策"""
-        from planner import Plan, Action
-
         # 使用资源管理器推荐
         recommended = self.resource_manager.recommend_action()
         if recommended:
@@ -805,125 +1045,171 @@ class MotaGUI:
         self.root.after(100, self._update_preview_from_thread)
 
         try:
-            frame = None
-            with self.frame_lock:
-                frame = self.current_frame
-
-            # 更新canvas
-            self.canvas.delete("all")
+            # 只在截图线程送来新帧时重绘
+            try:
+                buf = self._preview_q.get_nowait()
+            except queue.Empty:
+                if self._preview_shown:
+                    return
+                buf = None
 
-            if frame is None:
+            if buf is None:
                 # 没有截图时显示提示
-                self.canvas.create_text(
-                    208, 188,
-                    text="无游戏画面",
-                    fill='white',
-                    font=('Arial', 14, 'bold')
-                )
-
-                if self.manual_capture_region:
-                    region = self.manual_capture_region
-                    self.canvas.create_text(
-                        208, 218,
-                        text=f"手动区域: {region['width']}x{region['height']} 位置 ({region['left']}, {region['top']})",
-                        fill='yellow',
-                        font=('Arial', 10)
-                    )
+                region = self.manual_capture_region
+                if region:
+                    hint = f"手动区域: {region['width']}x{region['height']} 位置 ({region['left']}, {region['top']})"
                 else:
-                    self.canvas.create_text(
-                        208, 218,
-                        text="点击 '选择区域' 按钮选择截图区域",
-                        fill='yellow',
-                        font=('Arial', 10)
-                    )
-                return
-
-            # Debug模式：在原图上绘制检测框
-            if self.debug_mode.get() and self.detector:
-                frame = self._draw_detection_boxes(frame)
-
-            # 调整大小
-            h, w = frame.shape[:2]
-            scale = min(416 / w, 416 / h)
-            new_w, new_h = int(w * scale), int(h * scale)
-            resized = cv2.resize(frame, (new_w, new_h))
+                    hint = "点击 '选择区域' 按钮选择截图区域"
 
-            # 转换颜色
-            rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb)
-            photo = ImageTk.PhotoImage(pil_image)
-
-            # 显示图像
-            self.canvas.create_image(208, 208, image=photo)
-            self.canvas.image = photo  # 保持引用
-
-            # 画红框边框，表示这是截图区域
-            self.canvas.create_rectangle(
-                208 - new_w // 2, 208 - new_h // 2,
-                208 + new_w // 2, 208 + new_h // 2,
-                outline='red', width=2
-            )
+                overlay_key = ('empty', hint)
+                if overlay_key != self._preview_overlay_key:
+                    self._preview_overlay_key = overlay_key
+                    self.canvas.itemconfigure(self._canvas_hint_id, text=hint)
+                    self._set_preview_visible(False)
+                return
 
-            # 显示截图区域信息
+            # 截图线程已完成缩放和BGR->RGBA转换，UI线程只做映射和paste；paste完成后归还缓冲区
+            self._preview_shown = True
+            new_w, new_h = buf.size
+            try:
+                # RGBA缓冲区直接映射为PIL图像（不拷贝），paste时一次转换写入Tk
+                pil_image = Image.frombuffer('RGBA', (416, 416), buf.rgba, 'raw', 'RGBA', 0, 1)
+                self._preview_photo.paste(pil_image)
+                self._update_debug_overlay(buf)
+            finally:
+                self._preview_free.put(buf)
+
+            # 红框和截图区域信息只在内容变化时重绘
+            info_text = None
             if self.capture and self.capture.monitor:
                 region = self.capture.monitor
                 info_text = f"截图: {region['width']}x{region['height']} @ ({region['left']}, {region['top']})"
-                self.canvas.create_text(
-                    208, 208 - new_h // 2 - 15,
-                    text=info_text,
-                    fill='red',
-                    font=('Arial', 9, 'bold')
+
+            overlay_key = (new_w, new_h, info_text)
+            if overlay_key != self._preview_overlay_key:
+                self._preview_overlay_key = overlay_key
+
+                # 红框表示截图区域
+                self.canvas.coords(
+                    self._canvas_rect_id,
+                    208 - new_w // 2, 208 - new_h // 2,
+                    208 + new_w // 2, 208 + new_h // 2
                 )
 
+                # 截图区域信息
+                self.canvas.coords(self._canvas_info_id, 208, 208 - new_h // 2 - 15)
+                self.canvas.itemconfigure(self._canvas_info_id, text=info_text or "")
+                self._set_preview_visible(True)
+
         except Exception as e:
             # Debug模式下显示错误
             if self.debug_mode.get():
                 print(f"Preview update error: {e}")
             pass
 
+    def _on_root_visibility(self, event):
+        """主窗口映射状态变化（子控件的Map/Unmap事件也会传到这里，需要过滤）"""
+        if event.widget is self.root:
+            self._preview_visible = event.type == tk.EventType.Map
+
+    def _on_debug_mode_changed(self, *args):
+        """调试模式复选框变化时同步副本"""
+        self._debug_enabled = self.debug_mode.get()
+
+    def _set_preview_visible(self, visible: bool):
+        """切换画面预览元素与无画面提示的显示"""
+        shown, hidden = (tk.NORMAL, tk.HIDDEN) if visible else (tk.HIDDEN, tk.NORMAL)
+        for item in (self._canvas_img_id, self._canvas_rect_id, self._canvas_info_id):
+            self.canvas.itemconfigure(item, state=shown)
+        for item in (self._canvas_title_id, self._canvas_hint_id):
+            self.canvas.itemconfigure(item, state=hidden)
+
+    def _update_debug_overlay(self, buf):
+        """
+        用画布元素叠加Debug模式的玩家检测框、中心点和标签
+
+        检测结果的像素坐标按预览缓冲区的缩放比例和偏移换算到画布坐标；
+        检测结果和预览尺寸都未变化时不更新。
+
+        Args:
+            buf: 刚显示的预览缓冲区
+        """
+        show = bool(self._debug_enabled and self.detector)
+        det = self.detector.get_last_player_detection() if show else None
+        key = (show, buf.size)
+        if key == self._debug_overlay_key and det is self._debug_overlay_det:
+            return
+        self._debug_overlay_key = key
+        self._debug_overlay_det = det
+
+        boxes = []
+        if det:
+            scale = buf.scale
+            ox, oy = buf.offset
+            x, y, w, h = det['bbox']
+            x0, y0 = ox + x * scale, oy + y * scale
+            boxes.append((x0, y0, ox + (x + w) * scale, oy + (y + h) * scale, ''))
+
+            cx, cy = det['center']
+            cx, cy = ox + cx * scale, oy + cy * scale
+            boxes.append((cx - 3, cy - 3, cx + 3, cy + 3, DEBUG_OVERLAY_COLOR))
+
+            grid_pos = det['grid_pos']
+            self.canvas.coords(self._box_label_id, x0, y0 - 4)
+            self.canvas.itemconfigure(
+                self._box_label_id, text=f"Player: ({grid_pos[0]}, {grid_pos[1]})", state=tk.NORMAL
+            )
+        else:
+            self.canvas.itemconfigure(self._box_label_id, state=tk.HIDDEN)
+
+        self.canvas.itemconfigure(self._no_player_id, state=tk.NORMAL if show and not det else tk.HIDDEN)
+        self._show_boxes(boxes, DEBUG_OVERLAY_COLOR)
+
+    def _show_boxes(self, boxes, outline: str):
+        """
+        从对象池取画布矩形显示检测框，池中多余的矩形隐藏
+
+        Args:
+            boxes: [(x0, y0, x1, y1, 填充色), ...]，填充色为空字符串表示只画边框
+            outline: 边框颜色
+        """
+        while len(self._box_pool) < len(boxes):
+            self._box_pool.append(self.canvas.create_rectangle(0, 0, 0, 0, width=2, state=tk.HIDDEN))
+
+        for rid, (x0, y0, x1, y1, fill) in zip(self._box_pool, boxes):
+            self.canvas.coords(rid, x0, y0, x1, y1)
+            self.canvas.itemconfigure(rid, state=tk.NORMAL, outline=outline, fill=fill)
+        for rid in self._box_pool[len(boxes):]:
+            self.canvas.itemconfigure(rid, state=tk.HIDDEN)
+
     def _draw_detection_boxes(self, frame: np.ndarray) -> np.ndarray:
-        """在画面上绘制检测框（Debug模式）"""
-        debug_frame = frame.copy()
+        """在画面上绘制网格线、玩家轮廓和其他元素的格子框（Debug模式；玩家检测框由画布元素叠加）"""
+        # 复用同一块缓冲区，避免每帧 frame.copy() 分配新数组；
+        # 返回值只在截图线程中缩放进预览缓冲区，下一帧覆盖前已用完
+        if self._debug_buf is None or self._debug_buf.shape != frame.shape:
+            self._debug_buf = np.empty_like(frame)
+        debug_frame = self._debug_buf
+        np.copyto(debug_frame, frame)
 
         try:
             # 绘制网格辅助线（半透明）
-            h, w = debug_frame.shape[:2]
             grid_size = self.detector.GRID_SIZE if self.detector else 32
 
-            # 绘制网格线（很淡的灰色）
-            for x in range(0, w, grid_size):
-                cv2.line(debug_frame, (x, 0), (x, h), (50, 50, 50), 1)
-            for y in range(0, h, grid_size):
-                cv2.line(debug_frame, (0, y), (w, y), (50, 50, 50), 1)
+            # 绘制网格线（很淡的灰色）：按步长切片整列/整行赋值，代替逐条cv2.line
+            debug_frame[:, ::grid_size] = DEBUG_GRID_COLOR
+            debug_frame[::grid_size, :] = DEBUG_GRID_COLOR
 
-            # 绘制玩家检测框（绿色）
+            # 绘制玩家检测轮廓（绿色）；边界框、中心点和标签由画布元素叠加
             player_detection = self.detector.get_last_player_detection()
             if player_detection:
-                bbox = player_detection['bbox']
-                center = player_detection['center']
-                grid_pos = player_detection['grid_pos']
-
-                # 绘制检测轮廓
-                cv2.drawContours(debug_frame, [player_detection['contour']], -1, (0, 255, 0), 2)
-
-                # 绘制边界框
-                cv2.rectangle(debug_frame,
-                             (bbox[0], bbox[1]),
-                             (bbox[0] + bbox[2], bbox[1] + bbox[3]),
-                             (0, 255, 0), 2)
+                cv2.drawContours(debug_frame, [player_detection['contour']], -1, DEBUG_PLAYER_COLOR, 2)
 
-                # 绘制中心点
-                cv2.circle(debug_frame, center, 5, (0, 255, 0), -1)
-
-                # 绘制网格位置标签
-                label = f"Player: ({grid_pos[0]}, {grid_pos[1]})"
-                cv2.putText(debug_frame, label, (bbox[0], bbox[1] - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-            # 如果检测不到玩家，显示提示
-            else:
-                cv2.putText(debug_frame, "No Player Detected!", (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            # 怪物、门、钥匙、楼梯的格子框（橙色）：所有方框拼成一个轮廓数组，一次drawContours画完
+            detections = self._last_detections
+            if detections is not None and detections.player:
+                boxes = _detection_contours(detections, grid_size)
+                if boxes is not None:
+                    cv2.drawContours(debug_frame, boxes, -1, DEBUG_DETECTION_COLOR, 1)
 
         except Exception as e:
             print(f"Draw detection boxes error: {e}")
@@ -936,19 +1222,27 @@ class MotaGUI:
         self.root.after(100, self._update_status_from_thread)
 
         try:
-            if self.state and self.state.player:
-                player = self.state.player
-                self.status_labels['floor'].config(text=str(player.floor))
-                self.status_labels['hp'].config(text=f"{player.hp}/{player.max_hp}")
-                self.status_labels['atk'].config(text=str(player.atk))
-                self.status_labels['def'].config(text=str(player.defense))
-                self.status_labels['gold'].config(text=str(player.gold))
-                self.status_labels['keys'].config(text=f"Y{player.yellow_keys} B{player.blue_keys} R{player.red_keys}")
+            # 只读取一次快照；与上次显示的是同一个快照时不再格式化
+            snap = self._state_snap
+            if snap is not None and snap is not self._shown_state_snap:
+                self._shown_state_snap = snap
+                floor, hp, max_hp, atk, defense, gold, yellow_keys, blue_keys, red_keys = snap
+                labels = self.status_labels
+                set_label = self._set_label
+                set_label(labels['floor'], str(floor))
+                set_label(labels['hp'], f"{hp}/{max_hp}")
+                set_label(labels['atk'], str(atk))
+                set_label(labels['def'], str(defense))
+                set_label(labels['gold'], str(gold))
+                set_label(labels['keys'], f"Y{yellow_keys} B{blue_keys} R{red_keys}")
 
             # 更新决策显示
-            if self.current_decision:
-                self.decision_label.config(text=f"{self.current_decision.reason}")
-                self._update_decision_detail_safe(self.current_decision, self.current_action)
+            latest = self._latest
+            plan, action = latest
+            if plan and latest is not self._shown_latest:
+                self._shown_latest = latest
+                self._set_label(self.decision_label, f"{plan.reason}")
+                self._update_decision_detail_safe(plan, action)
 
             # 更新窗口信息
             self._update_window_info_from_thread()
@@ -956,33 +1250,51 @@ class MotaGUI:
         except Exception:
             pass
 
+    def _publish_state_snapshot(self):
+        """把玩家状态打包成元组发布给UI线程（单次属性赋值，读取方看到的总是完整的一份）"""
+        player = self.state.player
+        self._state_snap = (
+            player.floor, player.hp, player.max_hp, player.atk, player.defense,
+            player.gold, player.yellow_keys, player.blue_keys, player.red_keys
+        )
+
     def _update_window_info_from_thread(self):
         """从主线程更新窗口信息显示（线程安全）"""
         try:
-            import win32gui
-
             if self.capture and self.capture.window_handle:
-                # 获取窗口信息
+                # 窗口标题和位置很少变化：跨进程的Win32查询每 WINDOW_INFO_TICKS 次刷新才做一次，
+                # 窗口句柄变化时立即刷新；其余时间标签保持上次的显示
                 handle = self.capture.window_handle
+                self._wininfo_counter += 1
+                if handle == self._wininfo_handle and self._wininfo_counter < self.WINDOW_INFO_TICKS:
+                    return
+                self._wininfo_counter = 0
+                self._wininfo_handle = handle
+
+                # 获取窗口信息
                 title = win32gui.GetWindowText(handle)
                 rect = win32gui.GetWindowRect(handle)
                 monitor = self.capture.monitor
 
                 # 更新显示
-                self.window_info_labels['title'].config(
-                    text=f"{title[:40]}... (HWND: {handle})" if len(title) > 40 else title
+                self._set_label(
+                    self.window_info_labels['title'],
+                    f"{title[:40]}... (HWND: {handle})" if len(title) > 40 else title
                 )
-                self.window_info_labels['pos'].config(
-                    text=f"({rect[0]}, {rect[1]})"
+                self._set_label(
+                    self.window_info_labels['pos'],
+                    f"({rect[0]}, {rect[1]})"
                 )
-                self.window_info_labels['size'].config(
-                    text=f"{rect[2] - rect[0]}x{rect[3] - rect[1]}"
+                self._set_label(
+                    self.window_info_labels['size'],
+                    f"{rect[2] - rect[0]}x{rect[3] - rect[1]}"
                 )
 
                 # 显示截图区域
                 if monitor:
-                    self.window_info_labels['capture'].config(
-                        text=f"x:{monitor['left']}, y:{monitor['top']}, {monitor['width']}x{monitor['height']}"
+                    self._set_label(
+                        self.window_info_labels['capture'],
+                        f"x:{monitor['left']}, y:{monitor['top']}, {monitor['width']}x{monitor['height']}"
                     )
 
         except Exception:
@@ -997,15 +1309,19 @@ class MotaGUI:
         pass
 
     def _update_decision_detail_safe(self, plan, action):
-        """线程安全的决策详情更新"""
+        """线程安全的决策详情更新（文字与当前显示相同时不重写文本框）"""
         try:
-            self.detail_text.delete(1.0, tk.END)
-
+            lines = []
             if action:
-                self.detail_text.insert(tk.END, f"动作: {action.value}\n")
-            self.detail_text.insert(tk.END, f"目标: ({plan.target_x}, {plan.target_y})\n")
-            self.detail_text.insert(tk.END, f"消耗: {plan.expected_cost} 生命\n")
-            self.detail_text.insert(tk.END, f"收益: {plan.expected_gain} 金币")
+                lines.append(f"动作: {action.value}")
+            lines.append(f"目标: ({plan.target_x}, {plan.target_y})")
+            lines.append(f"消耗: {plan.expected_cost} 生命")
+            lines.append(f"收益: {plan.expected_gain} 金币")
+            text = "\n".join(lines)
+
+            if text != self._detail_text:
+                self._detail_text = text
+                self.detail_text.replace('1.0', tk.END, text)
         except Exception:
             pass
 
@@ -1014,6 +1330,16 @@ class MotaGUI:
         # 简化版本，实际可以使用FrameBuffer
         return True
 
+    def _poll_window_moved(self):
+        """定时检查游戏窗口是否被移动（在主线程中，避免Win32调用占用bot线程）"""
+        self.root.after(self.WINDOW_CHECK_INTERVAL, self._poll_window_moved)
+
+        try:
+            if self.running and self.capture and self.capture.check_window_moved():
+                self._window_moved = True
+        except Exception:
+            pass
+
     def update_timer(self):
         """更新定时器"""
         # 始终调度下一次更新，确保循环不会中断
@@ -1022,7 +1348,9 @@ class MotaGUI:
         try:
             if self.start_time and self.running:
                 elapsed = int(time.time() - self.start_time)
-                self.time_var.set(f"运行: {elapsed}秒")
+                if elapsed != self._last_elapsed:
+                    self._last_elapsed = elapsed
+                    self.time_var.set(f"运行: {elapsed}秒")
         except Exception:
             pass
 
@@ -1042,6 +1370,8 @@ class RegionSelector:
         self.start_x = None
         self.start_y = None
         self.rect_id = None
+        self._pending_drag = None  # 尚未绘制的拖拽位置 (x, y)
+        self._drag_after_id = None  # 已调度的选择框重绘
 
         # 创建全屏窗口
         self.top = tk.Toplevel(parent)
@@ -1079,16 +1409,37 @@ class RegionSelector:
         self.start_x = event.x
         self.start_y = event.y
 
-        # 创建矩形
-        self.rect_id = self.canvas.create_rectangle(
-            self.start_x, self.start_y, self.start_x, self.start_y,
-            outline='red', width=2
-        )
+        # 选择框只创建一次，之后每次按下时移动并显示
+        if self.rect_id is None:
+            self.rect_id = self.canvas.create_rectangle(
+                self.start_x, self.start_y, self.start_x, self.start_y,
+                outline='red', width=2
+            )
+        else:
+            self.canvas.coords(self.rect_id, self.start_x, self.start_y, self.start_x, self.start_y)
+            self.canvas.itemconfigure(self.rect_id, state=tk.NORMAL)
 
     def on_mouse_drag(self, event):
-        """鼠标拖拽"""
+        """鼠标拖拽（只记录位置，一批拖拽事件处理完后统一重绘一次选择框）"""
         if self.rect_id:
-            self.canvas.coords(self.rect_id, self.start_x, self.start_y, event.x, event.y)
+            self._pending_drag = (event.x, event.y)
+            if self._drag_after_id is None:
+                self._drag_after_id = self.canvas.after_idle(self._flush_drag)
+
+    def _flush_drag(self):
+        """把最新的拖拽位置画到选择框上"""
+        self._drag_after_id = None
+        if self._pending_drag and self.rect_id:
+            x, y = self._pending_drag
+            self.canvas.coords(self.rect_id, self.start_x, self.start_y, x, y)
+        self._pending_drag = None
+
+    def _cancel_drag_redraw(self):
+        """取消尚未执行的选择框重绘（窗口关闭前调用）"""
+        if self._drag_after_id is not None:
+            self.canvas.after_cancel(self._drag_after_id)
+            self._drag_after_id = None
+        self._pending_drag = None
 
     def on_mouse_up(self, event):
         """鼠标释放"""
@@ -1104,8 +1455,7 @@ class RegionSelector:
 
             # 最小尺寸检查
             if width < 50 or height < 50:
-                self.canvas.delete(self.rect_id)
-                self.rect_id = None
+                self.canvas.itemconfigure(self.rect_id, state=tk.HIDDEN)
                 return
 
             # 保存区域
@@ -1117,6 +1467,7 @@ class RegionSelector:
             }
 
             # 关闭窗口
+            self._cancel_drag_redraw()
             self.top.destroy()
 
             # 调用回调
@@ -1125,15 +1476,318 @@ class RegionSelector:
 
     def cancel(self):
         """取消选择"""
+        self._cancel_drag_redraw()
         self.top.destroy()
         print("Region selection cancelled")
 
 
+@lru_cache(maxsize=8)
+def _build_grid(width: int, height: int, monsters, doors, keys, stairs) -> np.ndarray:
+    """
+    根据元素坐标构建网格数据（结果被缓存，返回的数组只读）
+
+    Args:
+        width: 网格宽度
+        height: 网格高度
+        monsters: 怪物坐标元组 ((x, y), ...)
+        doors: 门坐标元组
+        keys: 钥匙坐标元组
+        stairs: (上楼坐标或None, 下楼坐标或None)
+
+    Returns:
+        网格数据 (height, width)
+    """
+    # 与 FloorData.grid 相同的 int8 存储，写入数据库时无需转换类型
+    grid = np.zeros((height, width), dtype=np.int8)
+
+    # 坐标拼成 (N, 2) 数组后一次性写入；同一格子按 怪物 < 门 < 钥匙 < 楼梯 的顺序后写覆盖先写
+    stair_points = tuple(pos for pos in stairs if pos)
+    points = monsters + doors + keys + stair_points
+    if points:
+        coords = np.array(points, dtype=np.intp)
+        types = np.repeat([3, 2, 4, 5], [len(monsters), len(doors), len(keys), len(stair_points)])
+        xs, ys = coords[:, 0], coords[:, 1]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        grid[ys[inside], xs[inside]] = types[inside]
+
+    grid.flags.writeable = False
+    return grid
+
+
+SAVE_META_FIELDS = ('floor', 'hp', 'max_hp', 'atk', 'gold')
+
+_save_slot_lock = threading.Lock()
+
+
+def _save_meta_path(filepath: str) -> str:
+    """存档对应的摘要文件路径：save_1.json -> save_1.meta.json"""
+    root, ext = os.path.splitext(filepath)
+    return f"{root}.meta{ext}"
+
+
+def _file_stamp(filepath: str):
+    """文件的 (修改时间, 大小)，文件不存在时返回None"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _write_save_slot(state_dict: dict, filepath: str):
+    """
+    写入存档，并在旁边写一个只含存档信息栏所需字段的摘要文件
+
+    Args:
+        state_dict: GameState.snapshot() 生成的状态快照
+        filepath: 存档路径
+    """
+    player = state_dict['player']
+    meta = {field: player[field] for field in SAVE_META_FIELDS}
+    meta['save_time'] = state_dict.get('save_time', '')
+
+    # 后台自动存档和界面线程的手动存档可能写同一个槽位，逐个串行写入
+    with _save_slot_lock:
+        GameState.write_state(state_dict, filepath)
+        with open(_save_meta_path(filepath), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+
+def _read_save_header(filepath: str, stamp) -> dict:
+    """
+    读取存档信息栏所需的字段
+
+    优先读取摘要文件；摘要不存在或比存档旧时，回退为读取完整存档。
+
+    Args:
+        filepath: 存档路径
+        stamp: 存档的 _file_stamp()
+
+    Returns:
+        dict: floor/hp/max_hp/atk/gold/save_time
+    """
+    meta_stamp = _file_stamp(_save_meta_path(filepath))
+    if meta_stamp is not None and meta_stamp[0] >= stamp[0]:
+        with open(_save_meta_path(filepath), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        state_dict = json.load(f)
+    header = {field: state_dict['player'][field] for field in SAVE_META_FIELDS}
+    header['save_time'] = state_dict.get('save_time', '')
+    return header
+
+
+class _PreviewBuffer:
+    """
+    416x416 的预览缓冲区，帧居中缩放写入其中
+
+    截图线程先缩放到BGR缓冲区，再转换为RGBA缓冲区；RGBA的内存布局与PIL的
+    RGBA图像一致，UI线程用 Image.frombuffer 直接映射，paste时只做一次转换
+    """
+
+    def __init__(self):
+        self.bgr = np.zeros((416, 416, 3), dtype=np.uint8)
+        self.rgba = np.zeros((416, 416, 4), dtype=np.uint8)
+        self.size = (0, 0)    # 缩放后的 (宽, 高)
+        self.offset = (0, 0)  # 缩放后的画面在缓冲区中的左上角
+        self.scale = 1.0      # 帧像素到缓冲区像素的缩放比例
+        self._frame_shape = None
+        self._view = None
+        self._rgba_view = None
+
+    def layout(self, frame_shape):
+        """
+        计算帧缩放后的尺寸及其在缓冲区中的居中视图
+
+        截图区域选定后帧尺寸固定，结果按帧尺寸缓存；尺寸变化时清空缓冲区的黑边。
+
+        Args:
+            frame_shape: 帧的 (高, 宽)
+
+        Returns:
+            (new_w, new_h, view)
+        """
+        if frame_shape != self._frame_shape:
+            h, w = frame_shape
+            scale = min(416 / w, 416 / h)
+            new_w, new_h = int(w * scale), int(h * scale)
+            x0 = (416 - new_w) // 2
+            y0 = (416 - new_h) // 2
+
+            self.bgr.fill(0)
+            self.rgba.fill(0)
+            self.size = (new_w, new_h)
+            self.offset = (x0, y0)
+            self.scale = scale
+            self._view = self.bgr[y0:y0 + new_h, x0:x0 + new_w]
+            self._rgba_view = self.rgba[y0:y0 + new_h, x0:x0 + new_w]
+            self._frame_shape = frame_shape
+        return self.size[0], self.size[1], self._view
+
+    def to_rgba(self):
+        """把BGR缓冲区中的画面区域转换写入RGBA缓冲区（黑边不变，无需转换）"""
+        cv2.cvtColor(self._view, cv2.COLOR_BGR2RGBA, dst=self._rgba_view)
+
+
+class _LoopClock:
+    """按截止时间节拍运行循环，并根据最近的循环耗时自适应调整周期"""
+
+    def __init__(self, period: float, min_period: float, window: int = 20):
+        """
+        Args:
+            period: 初始周期，也是周期上限（秒）
+            min_period: 周期下限（秒）
+            window: 统计循环耗时的窗口大小
+        """
+        self.period = period
+        self.max_period = period
+        self.min_period = min_period
+        self._durations = deque(maxlen=window)
+        self._next_tick = time.perf_counter()
+
+    def wait(self, loop_start: float):
+        """
+        记录本轮耗时并睡到下一个截止时间（已经落后时不等待，也不补偿）
+
+        Args:
+            loop_start: 本轮开始时的 time.perf_counter()
+        """
+        now = time.perf_counter()
+        self._durations.append(now - loop_start)
+        self._adapt()
+
+        self._next_tick = max(self._next_tick + self.period, now)
+        time.sleep(self._next_tick - now)
+
+    def _adapt(self):
+        """窗口内95%的循环都远快于周期时减半周期，慢于周期时加倍（调整后重新统计）"""
+        if len(self._durations) < self._durations.maxlen:
+            return
+
+        p95 = np.percentile(self._durations, 95)
+        if p95 < 0.6 * self.period and self.period > self.min_period:
+            self.period = max(self.period / 2, self.min_period)
+            self._durations.clear()
+        elif p95 > self.period and self.period < self.max_period:
+            self.period = min(self.period * 2, self.max_period)
+            self._durations.clear()
+
+
+class _LatestWriter:
+    """后台写文件线程：待写入的任务只保留最新一个，未执行的旧任务被新任务替换"""
+
+    def __init__(self, name: str):
+        self._q = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, write_fn, *args, on_done=None):
+        """
+        提交写入任务
+
+        Args:
+            write_fn: 写文件函数，在后台线程中以 write_fn(*args) 调用
+            *args: 参数（应为快照，之后不再被修改）
+            on_done: 写入成功后在后台线程中调用的回调
+        """
+        try:
+            self._q.get_nowait()
+            self._q.task_done()
+        except queue.Empty:
+            pass
+        self._q.put((write_fn, args, on_done))
+
+    def flush(self):
+        """阻塞直到所有已提交的任务写入完成"""
+        self._q.join()
+
+    def _worker(self):
+        while True:
+            write_fn, args, on_done = self._q.get()
+            try:
+                write_fn(*args)
+            except Exception as e:
+                print(f"后台保存失败: {e}")
+            else:
+                if on_done:
+                    try:
+                        on_done()
+                    except RuntimeError:
+                        pass  # 界面已关闭
+            finally:
+                self._q.task_done()
+
+
+def _detection_contours(detections, grid_size: int):
+    """
+    把识别到的怪物、门、钥匙、楼梯换算成格子方框轮廓
+
+    怪物坐标相对地图区域，门、钥匙、楼梯是整帧的网格坐标。
+
+    Args:
+        detections: 识别结果 FrameDetections
+        grid_size: 网格大小（像素）
+
+    Returns:
+        (N, 4, 1, 2) int32 轮廓数组，可直接传给 cv2.drawContours；没有元素时返回None
+    """
+    x_start = MAP_REGION.get('x_start', 140)
+    y_start = MAP_REGION.get('y_start', 60)
+    stairs = [p for p in detections.stairs.values() if p]
+
+    cells = [(x_start + m.x * grid_size, y_start + m.y * grid_size) for m in detections.monsters]
+    cells += [(o.x * grid_size, o.y * grid_size) for o in (*detections.doors, *detections.keys, *stairs)]
+    if not cells:
+        return None
+
+    x0, y0 = np.array(cells, dtype=np.int32).T
+    x1 = x0 + grid_size - 1
+    y1 = y0 + grid_size - 1
+    corners = np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1)
+    return corners.reshape(-1, 4, 1, 2)
+
+
+def _frame_signature(frame: np.ndarray, stride: int) -> bytes:
+    """
+    计算帧的快速指纹（按步长采样像素后做8字节blake2b摘要）
+
+    Args:
+        frame: BGR图像
+        stride: 采样步长
+
+    Returns:
+        指纹字节串
+    """
+    return hashlib.blake2b(frame[::stride, ::stride].tobytes(), digest_size=8).digest()
+
+
+def _put_latest(q: queue.Queue, item):
+    """
+    向容量为1的队列放入最新数据，丢弃尚未被取走的旧数据
+
+    Returns:
+        被丢弃的旧数据，没有时返回None
+    """
+    stale = None
+    try:
+        stale = q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        pass
+    return stale
+
+
 def main():
     """主函数"""
+    ensure_paths()
     root = tk.Tk()
-    MotaGUI(root)
+    app = MotaGUI(root)
     root.mainloop()
+    app.flush_saves()
 
 
 if __name__ == "__main__":
@@ -3,7 +3,11 @@
 """
 import sys
 import time
+import random
+import hashlib
 import argparse
+import queue
+import threading
 from datetime import datetime
 from pathlib import Path
 
@@ -11,10 +15,11 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
-from capture import ScreenCapture, FrameBuffer
-from detector import GameElementDetector
+from config import ensure_paths
+from capture import ScreenCapture, FrameBuffer, stability_thumbnail
+from detector import GameElementDetector, fill_grid
 from state import GameState
-from planner import GamePlanner, AggressiveStrategy
+from planner import GamePlanner, AggressiveStrategy, Plan, Action
 from controller import Controller, SmartController, ReplayRecorder
 from resource_manager import ResourceManager, ForwardPlanner
 from shop import ShopAnalyzer
@@ -23,6 +28,9 @@ from shop import ShopAnalyzer
 class MotaBot:
     """魔塔自动游玩机器人"""
 
+    CAPTURE_INTERVAL = 0.05  # 截图线程的截图间隔（秒）
+    LOOP_PERIOD = 0.1        # 主循环执行动作后的节拍周期（秒）
+
     def __init__(self,
                  window_title: str = "魔塔",
                  strategy: str = "normal",
@@ -50,6 +58,15 @@ class MotaBot:
         # 帧缓冲（用于检测动画结束）
         self.frame_buffer = FrameBuffer(size=3)
 
+        # 截图线程 -> 主循环：容量为1的帧队列，只保留最新一帧 (截图时间, BGRA帧)
+        self.capture_thread = None
+        self._frame_q = queue.Queue(maxsize=1)
+        self._last_action_time = 0.0  # 上次执行动作的时间，早于它的帧视为过期
+
+        # 识别结果缓存：稳定帧的缩略图指纹与上一次识别时相同则直接复用结果
+        self._last_thumb_sig = None
+        self._last_detections = None
+
         # 元素检测器
         print("  - 元素检测器")
         self.detector = GameElementDetector()
@@ -97,6 +114,10 @@ class MotaBot:
         print("=" * 50)
         print("\n按 Ctrl+C 停止\n")
 
+        # 截图在独立线程中进行，主循环只负责识别和决策
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
+
         try:
             self._main_loop()
         except KeyboardInterrupt:
@@ -108,37 +129,80 @@ class MotaBot:
         finally:
             self.stop()
 
+    def _capture_loop(self):
+        """截图线程：按固定间隔截图，送入帧队列（队列满时用新帧替换旧帧）"""
+        while self.running:
+            # 时间戳取截图开始的时刻：动作完成前开始的截图必须被判为旧帧
+            stamp = time.perf_counter()
+            try:
+                # capture_bgra() 引用 mss 的截图缓冲区，送出去的帧需要独立的副本
+                raw = self.capture.capture_bgra().copy()
+            except Exception as e:
+                print(f"截图错误: {e}")
+                time.sleep(0.5)
+                continue
+
+            item = (stamp, raw)
+            try:
+                self._frame_q.put_nowait(item)
+            except queue.Full:
+                # 主循环还没取走上一帧：丢弃旧帧，放入最新一帧（只有本线程写入队列）
+                try:
+                    self._frame_q.get_nowait()
+                except queue.Empty:
+                    pass
+                self._frame_q.put_nowait(item)
+
+            time.sleep(self.CAPTURE_INTERVAL)
+
     def _main_loop(self):
         """主循环"""
         last_action = None
         action_repeat_count = 0
         MAX_REPEAT = 3  # 最大重复次数
+        next_tick = time.monotonic()  # 下一轮的截止时间
 
         while self.running:
             self.loop_count += 1
 
-            # 1. 截图
-            frame = self.capture.capture()
+            # 1. 从截图线程取帧（原始BGRA，稳定性判断不需要颜色转换）
+            try:
+                stamp, raw = self._frame_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if stamp < self._last_action_time:
+                # 动作执行前截取的帧，画面还没反映动作结果
+                continue
 
-            # 2. 检测画面是否稳定（动画是否结束）
-            self.frame_buffer.add(frame)
+            # 2. 检测画面是否稳定（动画是否结束）：只比较64x64灰度缩略图
+            thumb = stability_thumbnail(raw)
+            self.frame_buffer.add(thumb)
 
             if not self.frame_buffer.is_stable(threshold=0.98):
                 # 画面还在动画中，等待
                 time.sleep(0.05)
                 continue
 
-            # 3. 识别游戏元素
-            player = self.detector.detect_player(frame)
+            # 3. 识别游戏元素（缩略图与上一次识别时完全相同则复用结果，不做颜色转换和识别）
+            sig = hashlib.blake2b(thumb.tobytes(), digest_size=8).digest()
+            if sig == self._last_thumb_sig:
+                detections = self._last_detections
+            else:
+                # 画面稳定后才转换为BGR用于识别
+                frame = self.capture.to_bgr(raw)
+                detections = self.detector.detect_all(frame)
+                self._last_thumb_sig = sig
+                self._last_detections = detections
+            player = detections.player
             if not player:
                 print("无法检测到玩家位置，等待...")
                 time.sleep(0.5)
                 continue
 
-            monsters = self.detector.detect_monsters(frame)
-            doors = self.detector.detect_doors(frame)
-            keys = self.detector.detect_keys(frame)
-            stairs = self.detector.detect_stairs(frame)
+            monsters = detections.monsters
+            doors = detections.doors
+            keys = detections.keys
+            stairs = detections.stairs
 
             # 调试：显示检测到的元素（每次都显示）
             print(f"[调试] 玩家位置: ({player.x}, {player.y})")
@@ -162,16 +226,7 @@ class MotaBot:
             current_floor.stairs = stairs
 
             # 更新网格地图
-            for m in monsters:
-                current_floor.set_cell_type(m.x, m.y, 3)
-            for d in doors:
-                current_floor.set_cell_type(d.x, d.y, 2)
-            for k in keys:
-                current_floor.set_cell_type(k.x, k.y, 4)
-            if stairs.get('up'):
-                current_floor.set_cell_type(stairs['up'].x, stairs['up'].y, 5)
-            if stairs.get('down'):
-                current_floor.set_cell_type(stairs['down'].x, stairs['down'].y, 5)
+            fill_grid(current_floor.grid, monsters, doors, keys, stairs)
 
             # 5. 规划下一步动作（使用资源管理器）
             action, plan = self._plan_next_action()
@@ -197,6 +252,7 @@ class MotaBot:
                     print(f"  状态: {self.state}")
 
             self.controller.execute(action)
+            self._last_action_time = time.perf_counter()
             self.recorder.record(action)
 
             # 8. 检查游戏是否结束
@@ -209,13 +265,16 @@ class MotaBot:
                 print("\n恭喜通关！")
                 break
 
-            # 10. 控制循环速度
-            time.sleep(0.1)
+            # 10. 控制循环速度：按截止时间节拍睡眠，扣除本轮已用的时间；已经落后时不补偿
+            next_tick += self.LOOP_PERIOD
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
 
     def _plan_next_action(self):
         """规划下一步动作"""
-        from planner import Plan, Action
-
         # 使用资源管理器推荐行动
         recommended = self.resource_manager.recommend_action()
         if recommended:
@@ -237,7 +296,6 @@ class MotaBot:
 
     def _get_random_action(self):
         """获取随机动作"""
-        import random
         actions = [
             Action.UP, Action.DOWN, Action.LEFT, Action.RIGHT
         ]
@@ -266,11 +324,13 @@ class MotaBot:
     def stop(self):
         """停止"""
         self.running = False
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=1.0)
         self.recorder.stop()
 
         # 保存录制
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        replay_file = f"logs/replay_{timestamp}.json"
+        replay_file = f"logs/replay_{timestamp}.npz"
         Path("logs").mkdir(exist_ok=True)
         self.recorder.save(replay_file)
         print(f"录制已保存: {replay_file}")
@@ -353,6 +413,8 @@ def main():
 
     args = parser.parse_args()
 
+    ensure_paths()
+
     if args.test:
         test_detection()
         return
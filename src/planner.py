@@ -3,12 +3,19 @@
 负责计算最优路径和做出游戏决策
 """
 import heapq
-from typing import List, Tuple, Optional, Dict, Callable
+from collections import deque
+from typing import List, Tuple, Optional, Dict, Callable, Set
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 from state import GameState, PlayerState, FloorState
 from detector import Monster, Door, Key, Point
+from fastcvt import grid_astar, grid_bfs, grid_flood
+
+# 四邻域方向（上、下、左、右），与 fastcvt 网格内核的展开顺序一致
+_DIRS: Tuple[Tuple[int, int], ...] = ((0, -1), (0, 1), (-1, 0), (1, 0))
 
 
 class Action(Enum):
@@ -53,38 +60,103 @@ class PathFinder:
         if start == goal:
             return []
 
-        queue = [(start, [])]
-        visited = {start}
+        width, height = floor.width, floor.height
+        sx, sy = start
+        if 0 <= sx < width and 0 <= sy < height:
+            # 搜索在网格数组上进行（有Numba时为JIT内核），只记录前驱，找到后再回溯路径
+            parent = np.empty(width * height, dtype=np.int32)
+            last = int(grid_bfs(floor.grid[:height, :width], sx, sy, goal[0], goal[1], obstacles, parent))
+            if last < 0:
+                return None
+
+            path = PathFinder.trace(parent, width, sy * width + sx, last)
+            path.append(goal)
+            return path
+
+        # 起点在楼层外（玩家坐标按整帧换算，可能超出楼层宽度）时逐格搜索，可以从界外走进楼层
+        cells = floor.grid[:height, :width].ravel().tolist()
+        came_from: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        queue = deque([start])
 
         while queue:
-            (x, y), path = queue.pop(0)
+            current = queue.popleft()
+            x, y = current
 
-            # 四个方向
-            for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
+            for dx, dy in _DIRS:
                 nx, ny = x + dx, y + dy
+                neighbor = (nx, ny)
 
-                if (nx, ny) == goal:
-                    return path + [(nx, ny)]
+                if neighbor == goal:
+                    path = [goal]
+                    while current != start:
+                        path.append(current)
+                        current = came_from[current]
+                    path.reverse()
+                    return path
 
                 # 检查边界
-                if not (0 <= nx < floor.width and 0 <= ny < floor.height):
+                if not (0 <= nx < width and 0 <= ny < height):
                     continue
 
                 # 检查是否访问过
-                if (nx, ny) in visited:
+                if neighbor in came_from:
                     continue
 
                 # 检查障碍物
-                if obstacles:
-                    cell_type = floor.get_cell_type(nx, ny)
-                    if cell_type == 1:  # 墙
-                        continue
+                if obstacles and cells[ny * width + nx] == 1:
+                    continue
 
-                visited.add((nx, ny))
-                queue.append(((nx, ny), path + [(nx, ny)]))
+                came_from[neighbor] = current
+                queue.append(neighbor)
 
         return None
 
+    @staticmethod
+    def bfs_all(start: Tuple[int, int], floor: FloorState,
+                obstacles: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        从起点对整层做一次BFS泛洪
+
+        Args:
+            start: 起始坐标 (x, y)
+            floor: 楼层状态
+            obstacles: 是否考虑障碍物
+
+        Returns:
+            (dist, parent)：dist 为 (height, width) 步数数组（未到达为-1），
+            parent 为展平下标的前驱数组；起点不在楼层内时返回None
+        """
+        width, height = floor.width, floor.height
+        sx, sy = start
+        if not (0 <= sx < width and 0 <= sy < height):
+            return None
+
+        parent = np.empty(width * height, dtype=np.int32)
+        dist = np.empty((height, width), dtype=np.int32)
+        grid_flood(floor.grid[:height, :width], sx, sy, obstacles, parent, dist)
+        return dist, parent
+
+    @staticmethod
+    def trace(parent: np.ndarray, width: int, start_index: int, last: int) -> List[Tuple[int, int]]:
+        """
+        沿前驱数组回溯路径
+
+        Args:
+            parent: 展平下标的前驱数组
+            width: 网格宽度
+            start_index: 起点的展平下标
+            last: 路径终点的展平下标
+
+        Returns:
+            路径点列表（不含起点，含终点）
+        """
+        path = []
+        while last != start_index:
+            path.append((last % width, last // width))
+            last = int(parent[last])
+        path.reverse()
+        return path
+
     @staticmethod
     def a_star(start: Tuple[int, int], goal: Tuple[int, int],
                floor: FloorState, cost_func: Optional[Callable] = None) -> Optional[List[Tuple[int, int]]]:
@@ -103,12 +175,24 @@ class PathFinder:
         if start == goal:
             return []
 
+        width, height = floor.width, floor.height
+        sx, sy = start
+        if cost_func is None and 0 <= sx < width and 0 <= sy < height:
+            # 默认成本直接在网格数组上搜索（有Numba时为JIT内核）
+            parent = np.empty(width * height, dtype=np.int32)
+            if not grid_astar(floor.grid[:height, :width], sx, sy, goal[0], goal[1], parent):
+                return None
+            return PathFinder.trace(parent, width, sy * width + sx, goal[1] * width + goal[0])
+
         def heuristic(a, b):
             """曼哈顿距离启发式"""
             return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
+        # 单元格类型快照成平铺列表，循环内直接按下标读取
+        cells = floor.grid[:height, :width].ravel().tolist()
+
         def default_cost(x, y):
-            cell_type = floor.get_cell_type(x, y)
+            cell_type = cells[y * width + x]
             # 默认成本: 空地=1, 其他=10
             return 1 if cell_type == 0 else 10
 
@@ -119,9 +203,12 @@ class PathFinder:
         came_from: Dict[Tuple[int, int], Tuple[int, int]] = {}
         g_score: Dict[Tuple[int, int], int] = {start: 0}
         f_score: Dict[Tuple[int, int], int] = {start: heuristic(start, goal)}
+        # 同一格子可能被多个邻居反复松弛，启发值和成本按格子只计算一次
+        h_cache: Dict[Tuple[int, int], int] = {}
+        c_cache: Dict[Tuple[int, int], int] = {}
 
         while open_set:
-            _, current = heapq.heappop(open_set)
+            f, current = heapq.heappop(open_set)
 
             if current == goal:
                 # 重建路径
@@ -132,26 +219,36 @@ class PathFinder:
                 path.reverse()
                 return path
 
+            # 该格子之后又以更小的f入堆并已展开过，跳过过期条目
+            if f > f_score[current]:
+                continue
+
             x, y = current
 
-            for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
+            for dx, dy in _DIRS:
                 nx, ny = x + dx, y + dy
                 neighbor = (nx, ny)
 
                 # 检查边界
-                if not (0 <= nx < floor.width and 0 <= ny < floor.height):
+                if not (0 <= nx < width and 0 <= ny < height):
                     continue
 
                 # 检查是否是墙
-                if floor.get_cell_type(nx, ny) == 1:
+                if cells[ny * width + nx] == 1:
                     continue
 
-                tentative_g_score = g_score[current] + cost_func(nx, ny)
+                cost = c_cache.get(neighbor)
+                if cost is None:
+                    cost = c_cache[neighbor] = cost_func(nx, ny)
+                tentative_g_score = g_score[current] + cost
 
                 if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
+                    h = h_cache.get(neighbor)
+                    if h is None:
+                        h = h_cache[neighbor] = heuristic(neighbor, goal)
                     came_from[neighbor] = current
                     g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = tentative_g_score + heuristic(neighbor, goal)
+                    f_score[neighbor] = tentative_g_score + h
                     heapq.heappush(open_set, (f_score[neighbor], neighbor))
 
         return None
@@ -170,37 +267,54 @@ class PathFinder:
         Returns:
             可达位置集合
         """
+        # 门和怪物按坐标建索引（同一坐标保留列表中的第一个，与逐个查找一致）
+        doors: Dict[Tuple[int, int], Door] = {}
+        for door in floor.doors:
+            doors.setdefault((door.x, door.y), door)
+        monsters: Dict[Tuple[int, int], Monster] = {}
+        for monster in floor.monsters:
+            monsters.setdefault((monster.x, monster.y), monster)
+
+        # 访问标记用按行展开的平铺数组，省去坐标元组的哈希
+        width, height = floor.width, floor.height
+        cells = floor.grid[:height, :width].ravel().tolist()
+        seen = bytearray(width * height)
+        if 0 <= start[0] < width and 0 <= start[1] < height:
+            seen[start[1] * width + start[0]] = 1
+
         reachable = set()
-        queue = [start]
+        queue = deque([start])
         reachable.add(start)
 
         while queue:
-            x, y = queue.pop(0)
+            x, y = queue.popleft()
 
-            for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
+            for dx, dy in _DIRS:
                 nx, ny = x + dx, y + dy
 
-                if (nx, ny) in reachable:
+                # 检查边界
+                if not (0 <= nx < width and 0 <= ny < height):
                     continue
 
-                # 检查边界
-                if not (0 <= nx < floor.width and 0 <= ny < floor.height):
+                index = ny * width + nx
+                if seen[index]:
                     continue
 
-                cell_type = floor.get_cell_type(nx, ny)
+                cell_type = cells[index]
 
                 # 检查是否可通过
                 if cell_type == 1:  # 墙
                     continue
                 elif cell_type == 2:  # 门
-                    door = next((d for d in floor.doors if d.x == nx and d.y == ny), None)
+                    door = doors.get((nx, ny))
                     if door and not player.can_afford_door(door):
                         continue
                 elif cell_type == 3:  # 怪物
-                    monster = next((m for m in floor.monsters if m.x == nx and m.y == ny), None)
+                    monster = monsters.get((nx, ny))
                     if monster and not player.can_defeat(monster):
                         continue
 
+                seen[index] = 1
                 reachable.add((nx, ny))
                 queue.append((nx, ny))
 
@@ -219,6 +333,52 @@ class GamePlanner:
         """
         self.state = game_state
         self.path_finder = PathFinder()
+        # 整层BFS结果缓存 {obstacles: (局面键, (dist, parent))}
+        self._flood_cache: Dict[bool, tuple] = {}
+
+    def _flood(self, floor: FloorState, start: Tuple[int, int],
+               obstacles: bool) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        取从玩家当前位置出发的整层BFS结果
+
+        楼层、玩家位置和网格内容都不变时只泛洪一次，各规划方法和 get_next_step 共用。
+        """
+        key = (floor.floor_number, start, floor.grid.tobytes())
+        cached = self._flood_cache.get(obstacles)
+        if cached is None or cached[0] != key:
+            cached = (key, self.path_finder.bfs_all(start, floor, obstacles))
+            self._flood_cache[obstacles] = cached
+        return cached[1]
+
+    def _path_length(self, floor: FloorState, start: Tuple[int, int],
+                     goal: Tuple[int, int], obstacles: bool) -> Optional[int]:
+        """
+        玩家到目标的路径步数，与 len(PathFinder.bfs(...)) 一致
+
+        Returns:
+            步数；无路径或已在目标位置时返回None
+        """
+        flood = self._flood(floor, start, obstacles)
+        gx, gy = goal
+        if flood is not None and 0 <= gx < floor.width and 0 <= gy < floor.height:
+            steps = int(flood[0][gy, gx])
+            if steps >= 0:
+                return steps or None
+        # 泛洪未覆盖的目标（墙上或界外）仍按单目标BFS的规则处理
+        path = self.path_finder.bfs(start, goal, floor, obstacles)
+        return len(path) if path else None
+
+    def _find_path(self, floor: FloorState, start: Tuple[int, int],
+                   goal: Tuple[int, int], obstacles: bool) -> Optional[List[Tuple[int, int]]]:
+        """玩家到目标的路径，与 PathFinder.bfs(...) 一致，优先从整层BFS结果回溯"""
+        flood = self._flood(floor, start, obstacles)
+        gx, gy = goal
+        if flood is not None and 0 <= gx < floor.width and 0 <= gy < floor.height:
+            dist, parent = flood
+            if dist[gy, gx] >= 0:
+                width = floor.width
+                return self.path_finder.trace(parent, width, start[1] * width + start[0], gy * width + gx)
+        return self.path_finder.bfs(start, goal, floor, obstacles)
 
     def plan_next_action(self) -> Plan:
         """
@@ -227,7 +387,6 @@ class GamePlanner:
         Returns:
             执行计划
         """
-        current_floor = self.state.get_current_floor()
         player = self.state.player
 
         # 优先级1: 检查是否需要回血
@@ -278,18 +437,14 @@ class GamePlanner:
             return None
 
         # 过滤掉不可达的钥匙（被墙或其他障碍阻挡）
+        start = (player.x, player.y)
         valid_keys = []
         for key in current_floor.keys:
-            # 检查钥匙位置是否可达
-            path = self.path_finder.bfs(
-                (player.x, player.y),
-                (key.x, key.y),
-                current_floor,
-                obstacles=True  # 考虑障碍物
-            )
+            # 检查钥匙位置是否可达（考虑障碍物）
+            dist = self._path_length(current_floor, start, (key.x, key.y), obstacles=True)
 
-            if path:
-                valid_keys.append((key, len(path)))
+            if dist:
+                valid_keys.append((key, dist))
 
         # 如果没有可达的钥匙，清除钥匙列表（可能是旧数据）
         if not valid_keys:
@@ -321,89 +476,86 @@ class GamePlanner:
         if not current_floor.monsters:
             return None
 
-        # 找最优战斗目标
-        best_monster = None
-        best_score = float('-inf')
-
-        for monster in current_floor.monsters:
-            if not player.can_defeat(monster):
-                continue
-
-            # 计算战斗价值
-            _, damage_taken = player.calculate_battle(monster)
-            score = monster.gold - damage_taken * 2  # 简单的价值评估
-
-            # 考虑距离
-            path = self.path_finder.bfs(
-                (player.x, player.y),
-                (monster.x, monster.y),
-                current_floor,
-                obstacles=False
-            )
-
-            if path:
-                distance_cost = len(path)
-                score -= distance_cost
-
-                if score > best_score:
-                    best_score = score
-                    best_monster = monster
-
-        if best_monster:
-            _, damage_taken = player.calculate_battle(best_monster)
-            return Plan(
-                Action.WAIT,
-                best_monster.x,
-                best_monster.y,
-                damage_taken,
-                best_monster.gold,
-                f"击败{best_monster.name}"
-            )
+        start = (player.x, player.y)
+        flood = self._flood(current_floor, start, obstacles=False)
+
+        # 所有怪物一起评估：受到的伤害、战斗价值和距离
+        xs, ys, hp, atk, defense, gold = current_floor.monster_arrays()
+        damage = player.battle_damage(hp, atk, defense)
+
+        distance = np.zeros(len(xs), dtype=int)
+        if flood is not None:
+            inside = (xs >= 0) & (xs < current_floor.width) & (ys >= 0) & (ys < current_floor.height)
+            distance[inside] = flood[0][ys[inside], xs[inside]]
+            lookup = np.flatnonzero(~inside)
+        else:
+            lookup = range(len(xs))  # 玩家在楼层外，没有整层泛洪结果
+        for i in lookup:
+            # 泛洪未覆盖的目标按单目标BFS的规则处理
+            distance[i] = self._path_length(current_floor, start, (int(xs[i]), int(ys[i])), obstacles=False) or 0
+
+        # 能战胜且有路径（不在脚下）的怪物中取价值最高者，并列时取列表中靠前的
+        candidates = np.flatnonzero((damage >= 0) & (damage < player.hp) & (distance > 0))
+        if not candidates.size:
+            return None
+        score = gold - damage * 2 - distance  # 简单的价值评估
+        best = int(candidates[np.argmax(score[candidates])])
+        best_monster = current_floor.monsters[best]
+        damage_taken = int(damage[best])
 
-        return None
+        return Plan(
+            Action.WAIT,
+            best_monster.x,
+            best_monster.y,
+            damage_taken,
+            best_monster.gold,
+            f"击败{best_monster.name}"
+        )
 
     def _plan_explore(self) -> Optional[Plan]:
         """规划探索"""
         current_floor = self.state.get_current_floor()
-        player = self.state.player
-
-        # 找最近的未访问位置
-        unvisited = []
-        for y in range(current_floor.height):
-            for x in range(current_floor.width):
-                if not current_floor.is_visited(x, y) and current_floor.get_cell_type(x, y) != 1:
-                    unvisited.append((x, y))
-
-        if not unvisited:
-            return None
-
-        # 找最近的未访问位置
-        closest_pos = None
-        closest_dist = float('inf')
 
-        for pos in unvisited:
-            path = self.path_finder.bfs(
-                (player.x, player.y),
-                pos,
-                current_floor,
-                obstacles=False
-            )
-
-            if path and len(path) < closest_dist:
-                closest_dist = len(path)
-                closest_pos = pos
-
-        if closest_pos:
-            return Plan(
-                Action.WAIT,
-                closest_pos[0],
-                closest_pos[1],
-                0,
-                5,  # 探索的固定价值
-                "探索"
-            )
+        player = self.state.player
+        height, width = current_floor.height, current_floor.width
+        px, py = player.x, player.y
+
+        # 相邻格子已是最短的1步，有未访问的就直接选它；按逐行扫描的顺序检查，与下面并列时的选择一致
+        for x, y in ((px, py - 1), (px - 1, py), (px + 1, py), (px, py + 1)):
+            if (0 <= x < width and 0 <= y < height and current_floor.grid[y, x] != 1
+                    and not current_floor.is_visited(x, y)):
+                break
+        else:
+            # 未访问且不是墙的位置，取步数最小者；并列时与逐行扫描一样取第一个
+            candidates = (~current_floor.visited_mask()) & (current_floor.grid[:height, :width] != 1)
+            flood = self._flood(current_floor, (px, py), obstacles=False)
+            if flood is not None:
+                dist = flood[0]
+                candidates &= dist > 0  # 排除玩家所在格
+                if not candidates.any():
+                    return None
+
+                masked = np.where(candidates, dist, np.iinfo(np.int32).max)
+                y, x = np.unravel_index(int(np.argmin(masked)), masked.shape)
+            else:
+                # 玩家在楼层外，没有整层泛洪结果：逐个位置搜索
+                best = None
+                for y, x in zip(*np.nonzero(candidates)):
+                    dist = self._path_length(current_floor, (px, py), (int(x), int(y)), obstacles=False)
+                    if dist and (best is None or dist < best[0]):
+                        best = (dist, x, y)
+                if best is None:
+                    return None
+                _, x, y = best
 
-        return None
+        return Plan(
+            Action.WAIT,
+            int(x),
+            int(y),
+            0,
+            5,  # 探索的固定价值
+            "探索"
+        )
 
     def _plan_change_floor(self) -> Optional[Plan]:
         """规划换楼层"""
@@ -448,21 +600,18 @@ class GamePlanner:
         if plan.action in [Action.UP, Action.DOWN]:
             return plan.action
 
-        # 计算路径
-        current_floor = self.state.get_current_floor()
-        path = self.path_finder.bfs(
-            (self.state.player.x, self.state.player.y),
-            (plan.target_x, plan.target_y),
-            current_floor,
-            obstacles=False
-        )
+        # 计算路径（复用规划时的整层BFS结果）
+        player = self.state.player
+        px, py = player.x, player.y
+        path = self._find_path(self.state.get_current_floor(), (px, py),
+                               (plan.target_x, plan.target_y), obstacles=False)
 
-        if not path or len(path) == 0:
+        if not path:
             return Action.WAIT
 
-        next_pos = path[0]
-        dx = next_pos[0] - self.state.player.x
-        dy = next_pos[1] - self.state.player.y
+        next_x, next_y = path[0]
+        dx = next_x - px
+        dy = next_y - py
 
         if dy == -1:
             return Action.UP
@@ -87,13 +87,26 @@ class Node:
     player_state: PlayerState
     cost: ResourceCost
     gain: ResourceGain
-    path: List[Action]
+    # 行动序列不在每个节点上复制：只记录父节点和到达本节点的行动，需要时再回溯
+    parent: Optional['Node'] = None
+    action: Optional[Action] = None
+    depth: int = 0
     visited: Set[Tuple[int, int, int]] = field(default_factory=set)
 
     def __lt__(self, other):
         # 用于优先队列排序
         return True
 
+    def path(self) -> List[Action]:
+        """从初始节点到本节点的行动序列"""
+        actions = []
+        node = self
+        while node.action is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
+
 
 class ResourceEvaluator:
     """资源价值评估器"""
@@ -619,11 +632,10 @@ class ForwardPlanner:
             player_state=self.state.player.copy(),
             cost=ResourceCost(),
             gain=ResourceGain(),
-            path=[],
             visited={(self.state.current_floor, self.state.player.x, self.state.player.y)}
         )
 
-        best_sequence = []
+        best_node = None
         best_value = float('-inf')
 
         # 使用优先队列搜索
@@ -651,32 +663,36 @@ class ForwardPlanner:
 
                 new_cost = node.cost + action.cost
                 new_gain = node.gain + action.gain
-                new_path = node.path + [action]
+                new_depth = node.depth + 1
 
                 # 计算价值
                 gain_value = self.evaluator.evaluate_gain(new_gain)
                 cost_value = self.evaluator.evaluate_cost(new_cost)
                 total_value = gain_value - cost_value
 
+                new_node = Node(
+                    floor=action.target_floor,
+                    x=action.target_x,
+                    y=action.target_y,
+                    player_state=new_player,
+                    cost=new_cost,
+                    gain=new_gain,
+                    parent=node,
+                    action=action,
+                    depth=new_depth,
+                )
+
                 if total_value > best_value:
                     best_value = total_value
-                    best_sequence = new_path
+                    best_node = new_node
 
                 # 继续搜索
-                if len(new_path) < self.max_depth:
-                    new_node = Node(
-                        floor=action.target_floor,
-                        x=action.target_x,
-                        y=action.target_y,
-                        player_state=new_player,
-                        cost=new_cost,
-                        gain=new_gain,
-                        path=new_path,
-                        visited=node.visited | {(action.target_floor, action.target_x, action.target_y)}
-                    )
+                if new_depth < self.max_depth:
+                    new_node.visited = node.visited | {(action.target_floor, action.target_x, action.target_y)}
                     heapq.heappush(queue, (-total_value, new_node))
 
-        return best_sequence
+        # 只对最优节点回溯一次行动序列
+        return best_node.path() if best_node else []
 
     def _can_execute_action(self, node: Node, action: Action) -> bool:
         """检查是否可以执行行动"""
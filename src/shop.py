@@ -6,7 +6,11 @@ from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+import cv2
+import numpy as np
+
 from state import PlayerState, GameState
+from resource_manager import BattleCalculator
 
 
 class ShopItemType(Enum):
@@ -148,9 +152,6 @@ class ShopAnalyzer:
     def _find_new_defeatable_monsters(self, old_atk: int, new_atk: int,
                                       defense: int, hp: int) -> List:
         """找出提升攻击力后可以击败的新怪物"""
-        from detector import Monster
-        from resource_manager import BattleCalculator
-
         new_monsters = []
 
         # 遍历所有楼层的怪物
@@ -178,8 +179,6 @@ class ShopAnalyzer:
         # 计算所有可击败怪物在当前防御和新防御下的伤害差异
         total_saved_hp = 0
 
-        from resource_manager import BattleCalculator
-
         for floor in self.state.floors.values():
             for monster in floor.monsters:
                 if BattleCalculator.can_defeat(player, monster):
@@ -323,9 +322,6 @@ class ShopDetector:
         - 有购买提示
         """
         # 简化：通过颜色检测
-        import cv2
-        import numpy as np
-
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
 
         # 商店通常有绿色背景
@@ -9,7 +9,7 @@ from datetime import datetime
 import json
 import os
 
-from detector import PlayerInfo, Monster, Door, Key, Point
+from detector import PlayerInfo, Monster, Door, Key, Point, fill_grid
 
 
 @dataclass
@@ -85,6 +85,23 @@ class PlayerState:
 
         return hits_needed * player_damage_per_hit, total_damage_taken
 
+    def battle_damage(self, hp: np.ndarray, atk: np.ndarray, defense: np.ndarray) -> np.ndarray:
+        """
+        批量计算与一组怪物战斗受到的伤害（calculate_battle 的数组版本）
+
+        Args:
+            hp, atk, defense: 怪物属性数组
+
+        Returns:
+            受到的伤害数组，无法战胜的为-1
+        """
+        player_damage_per_hit = self.atk - defense
+        beatable = player_damage_per_hit > 0
+        player_damage_per_hit = np.where(beatable, player_damage_per_hit, 1)
+        hits_needed = (hp + player_damage_per_hit - 1) // player_damage_per_hit
+        total_damage_taken = hits_needed * np.maximum(0, atk - self.defense)
+        return np.where(beatable, total_damage_taken, -1)
+
     def can_defeat(self, monster: Monster) -> bool:
         """检查是否能战胜怪物"""
         _, damage_taken = self.calculate_battle(monster)
@@ -121,6 +138,31 @@ class FloorState:
         """检查位置是否访问过"""
         return (x, y) in self.visited
 
+    def visited_mask(self) -> np.ndarray:
+        """访问标记的 (height, width) 布尔数组（越界的记录忽略）"""
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        for x, y in self.visited:
+            if 0 <= y < self.height and 0 <= x < self.width:
+                mask[y, x] = True
+        return mask
+
+    def monster_arrays(self) -> Tuple[np.ndarray, ...]:
+        """
+        怪物列表按属性拆成数组，便于批量评估
+
+        Returns:
+            (x, y, hp, atk, defense, gold)
+        """
+        monsters = self.monsters
+        return (
+            np.array([m.x for m in monsters], dtype=int),
+            np.array([m.y for m in monsters], dtype=int),
+            np.array([m.hp for m in monsters]),
+            np.array([m.atk for m in monsters]),
+            np.array([m.defense for m in monsters]),
+            np.array([m.gold for m in monsters]),
+        )
+
     def get_cell_type(self, x: int, y: int) -> int:
         """获取指定位置的单元格类型"""
         if 0 <= y < self.height and 0 <= x < self.width:
@@ -305,27 +347,14 @@ class GameState:
         # 更新当前楼层状态
         current_floor = self.get_current_floor()
 
-        # 更新怪物
+        # 更新怪物、门、钥匙、楼梯
         current_floor.monsters = monsters
-        for monster in monsters:
-            current_floor.set_cell_type(monster.x, monster.y, 3)
-
-        # 更新门
         current_floor.doors = doors
-        for door in doors:
-            current_floor.set_cell_type(door.x, door.y, 2)
-
-        # 更新钥匙
         current_floor.keys = keys
-        for key in keys:
-            current_floor.set_cell_type(key.x, key.y, 4)
-
-        # 更新楼梯
         current_floor.stairs = stairs
-        if stairs.get('up'):
-            current_floor.set_cell_type(stairs['up'].x, stairs['up'].y, 5)
-        if stairs.get('down'):
-            current_floor.set_cell_type(stairs['down'].x, stairs['down'].y, 5)
+
+        # 一次花式索引赋值写入网格（怪物 < 门 < 钥匙 < 楼梯 的覆盖顺序与逐个设置相同）
+        fill_grid(current_floor.grid, monsters, doors, keys, stairs)
 
     def is_exploration_complete(self) -> bool:
         """检查是否探索完所有可到达区域"""
@@ -360,6 +389,15 @@ class GameState:
         - 门、钥匙、楼梯位置
         - 游戏进度（步数、当前楼层）
         """
+        self.write_state(self.snapshot(), filepath)
+
+    def snapshot(self) -> dict:
+        """
+        生成待保存状态的快照（全部为新建的字典/列表，可交给其他线程写入）
+
+        Returns:
+            dict: 可直接序列化为JSON的状态字典
+        """
         state_dict = {
             'version': '1.0',
             'save_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -422,6 +460,17 @@ class GameState:
             }
             state_dict['floors'][str(floor_num)] = floor_dict
 
+        return state_dict
+
+    @staticmethod
+    def write_state(state_dict: dict, filepath: str):
+        """
+        把 snapshot() 生成的状态快照写入文件
+
+        Args:
+            state_dict: 状态快照
+            filepath: 存档路径
+        """
         # 确保目录存在
         os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
 